@@ -0,0 +1,85 @@
+"""
+Size of the fbref and fbref_shots result sets best eleven fetches with
+``SELECT *`` versus the projected column lists, on an SQLite fixture with the
+width of the production tables. Sizes are in-memory bytes of the returned
+frames, a stand-in for bytes transferred.
+
+    python bench_column_projection.py
+"""
+import numpy as np
+import pandas as pd
+
+from footballdashboardsdata.besteleven import BestEleventDataSource, ScoreTable
+from footballdashboardsdata.utils.connection import SQLiteConnectionProvider
+
+ROWS = 10000
+SHOTS = 9000
+SCORED_ATTRIBUTES = 40
+UNUSED_FBREF_COLUMNS = 150
+UNUSED_SHOT_COLUMNS = 30
+
+
+def fixture(rng: np.random.Generator):
+    attributes = [f"attribute_{i}" for i in range(SCORED_ATTRIBUTES)]
+    positions = ["GK", "CB", "FB", "MF", "AMF", "WFW", "FW"]
+    reference = pd.DataFrame(
+        [(p, a, rng.random(), "defending") for p in positions for a in attributes],
+        columns=["position", "data_attribute", "score", "data_category"],
+    )
+    source = BestEleventDataSource
+    fbref = pd.DataFrame(
+        {
+            c: rng.integers(0, 10, ROWS)
+            for c in source.INDEX_COLS + source.DERIVED_INPUT_COLS + attributes
+        }
+    )
+    fbref["comp"] = "Premier League"
+    fbref["season"] = 2023
+    fbref["position"] = "CB,DM"
+    unused = pd.DataFrame(
+        rng.random((ROWS, UNUSED_FBREF_COLUMNS)),
+        columns=[f"unused_{i}" for i in range(UNUSED_FBREF_COLUMNS)],
+    )
+    fbref = pd.concat([fbref, unused], axis=1)
+    shots = pd.DataFrame(
+        {
+            "match_id": rng.integers(0, 380, SHOTS).astype(str),
+            "squad": rng.choice(["home", "away"], SHOTS),
+            "minute": rng.integers(1, 95, SHOTS),
+            "comp": "Premier League",
+            "season": 2023,
+            "outcome": rng.choice(["Goal", "Saved", "Off Target"], SHOTS),
+        }
+    )
+    unused = pd.DataFrame(
+        rng.random((SHOTS, UNUSED_SHOT_COLUMNS)),
+        columns=[f"unused_{i}" for i in range(UNUSED_SHOT_COLUMNS)],
+    )
+    shots = pd.concat([shots, unused], axis=1)
+    return reference, fbref, shots
+
+
+def nbytes(data: pd.DataFrame) -> int:
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+if __name__ == "__main__":
+    reference, fbref, shots = fixture(np.random.default_rng(0))
+    provider = SQLiteConnectionProvider()
+    provider.load_frame("fbref", fbref)
+    provider.load_frame("fbref_shots", shots)
+    source = BestEleventDataSource(provider)
+    columns = source._fbref_columns(ScoreTable(reference))
+
+    full = source._get_seasons_data("Premier League", 2023)
+    projected = source._get_seasons_data("Premier League", 2023, columns=columns)
+    print(
+        f"fbref: {full.shape[1]} -> {projected.shape[1]} columns, "
+        f"{nbytes(full) / 1e6:.1f} MB -> {nbytes(projected) / 1e6:.1f} MB"
+    )
+    full = source._get_shot_data("Premier League", 2023, None, None)
+    projected = source._get_shot_data("Premier League", 2023, None, None, columns=source.SHOT_COLS)
+    print(
+        f"fbref_shots: {full.shape[1]} -> {projected.shape[1]} columns, "
+        f"{nbytes(full) / 1e6:.2f} MB -> {nbytes(projected) / 1e6:.2f} MB"
+    )
@@ -0,0 +1,70 @@
+"""
+Runtime of BestEleventDataSource._attach_team_goal_conceded (the interval join
+in utils/intervals.py) on a synthetic full league season, checked against the
+per-row scan it replaced on a sample of rows.
+
+    python bench_intervals.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from footballdashboardsdata.besteleven import BestEleventDataSource
+
+MATCHES = 380
+PLAYERS_PER_SIDE = 14
+
+
+def season(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    match_ids = np.arange(MATCHES).astype(str)
+    players = pd.DataFrame(
+        {
+            "match_id": np.repeat(match_ids, 2 * PLAYERS_PER_SIDE),
+            "squad": np.tile(np.repeat(["home", "away"], PLAYERS_PER_SIDE), MATCHES),
+        }
+    )
+    starter = np.tile(np.r_[np.ones(11), np.zeros(PLAYERS_PER_SIDE - 11)], 2 * MATCHES)
+    entry = rng.integers(46, 89, len(players))
+    players["subbed_on"] = np.where(starter == 1, 0, entry)
+    players["subbed_off"] = np.where(
+        starter == 1, np.where(rng.random(len(players)) < 0.2, entry, 90), 90
+    )
+    goals = rng.poisson(1.4, 2 * MATCHES)
+    shots = pd.DataFrame(
+        {
+            "match_id": np.repeat(np.repeat(match_ids, 2), goals),
+            "squad": np.repeat(np.tile(["home", "away"], MATCHES), goals),
+            "minute": rng.integers(1, 95, goals.sum()),
+        }
+    )
+    return players, shots
+
+
+def row_scan(r: pd.Series, shots: pd.DataFrame) -> int:
+    return len(
+        shots.loc[
+            (shots["match_id"] == r["match_id"])
+            & (shots["squad"] != r["squad"])
+            & (shots["minute"] > r["subbed_on"] if r["subbed_on"] > 0 else True)
+            & (shots["minute"] <= r["subbed_off"])
+        ]
+    )
+
+
+if __name__ == "__main__":
+    players, shots = season()
+    source = BestEleventDataSource.__new__(BestEleventDataSource)
+    start = time.perf_counter()
+    source._attach_team_goal_conceded(players, shots)
+    elapsed = time.perf_counter() - start
+    print(f"{len(players)} player rows, {len(shots)} goals: {elapsed * 1e3:.1f} ms")
+
+    sample = players.sample(500, random_state=0)
+    start = time.perf_counter()
+    expected = sample.apply(row_scan, axis=1, shots=shots)
+    per_row = (time.perf_counter() - start) / len(sample)
+    assert (expected == sample["team_goals_conceded"]).all()
+    print(f"per-row scan: {per_row * len(players) * 1e3:.0f} ms estimated for the season")
+    assert elapsed < 1.0, "full season should take well under a second"
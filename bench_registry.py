@@ -0,0 +1,39 @@
+"""
+Dispatch cost of DataSource.get_class as the number of registered data sources
+grows, next to the recursive subclass scan it replaced.
+
+    python bench_registry.py
+"""
+import timeit
+
+from footballdashboardsdata.datasource import DataSource
+from footballdashboardsdata.utils.subclassing import get_all_subclasses
+
+
+def register_sources(start: int, stop: int):
+    for i in range(start, stop):
+        type(
+            f"BenchDataSource{i}",
+            (DataSource,),
+            {
+                "get_name": classmethod(lambda cls, i=i: f"bench_{i}"),
+                "impl_get_data": lambda self, **kwargs: None,
+            },
+        )
+
+
+def subclass_scan(name: str) -> type:
+    return next(c for c in get_all_subclasses(DataSource) if c.get_name() == name)
+
+
+if __name__ == "__main__":
+    registered = 0
+    print(f"{'sources':>8} {'registry (us)':>14} {'subclass scan (us)':>19}")
+    for size in [10, 100, 1000, 10000]:
+        register_sources(registered, size)
+        registered = size
+        # the last registered name is the worst case for the scan
+        name = f"bench_{size - 1}"
+        registry = min(timeit.repeat(lambda: DataSource.get_class(name), number=1000, repeat=5))
+        scan = min(timeit.repeat(lambda: subclass_scan(name), number=10, repeat=3))
+        print(f"{len(DataSource._registry):>8} {registry * 1e3:>14.2f} {scan * 1e5:>19.1f}")
@@ -0,0 +1,71 @@
+"""
+Runtime of BestEleventDataSource._attach_sub_on_sub_off over synthetic seasons
+of increasing size, next to the row-wise apply it replaced (on the smaller
+sizes only, since it is quadratic).
+
+    python bench_sub_on_off.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from footballdashboardsdata.besteleven import BestEleventDataSource
+
+PLAYERS_PER_MATCH = 28
+
+
+def season(matches: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = matches * PLAYERS_PER_MATCH
+    match_minutes = rng.choice([90, 93, 95, 120], matches)
+    started = np.tile(np.r_[np.ones(22), np.zeros(PLAYERS_PER_MATCH - 22)], matches)
+    minutes = np.where(
+        started == 1,
+        np.repeat(match_minutes, PLAYERS_PER_MATCH),
+        rng.integers(1, 45, rows),
+    )
+    return pd.DataFrame(
+        {
+            "match_id": np.repeat(np.arange(matches).astype(str), PLAYERS_PER_MATCH),
+            "minutes": minutes,
+            "game_started": started.astype(int),
+        }
+    )
+
+
+def row_wise(data: pd.DataFrame):
+    data["subbed_on"] = data.apply(
+        lambda r: 0
+        if r["game_started"] == 1
+        else data.loc[data["match_id"] == r["match_id"], "minutes"].max() - r["minutes"],
+        axis=1,
+    )
+    data["subbed_off"] = data.apply(
+        lambda r: data.loc[data["match_id"] == r["match_id"], "minutes"].max()
+        if r["game_started"] == 0
+        else r["minutes"],
+        axis=1,
+    )
+
+
+def timed(f, data: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    f(data)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    source = BestEleventDataSource.__new__(BestEleventDataSource)
+    source._attach_sub_on_sub_off(season(10))  # warm up
+    print(f"{'rows':>7} {'vectorized (ms)':>16} {'ns/row':>7} {'row-wise (ms)':>14}")
+    for matches in [95, 190, 380, 760, 1520, 3040]:
+        data = season(matches)
+        vectorized = timed(source._attach_sub_on_sub_off, data)
+        if matches <= 380:
+            reference = season(matches)
+            old = f"{timed(row_wise, reference) * 1e3:>14.0f}"
+            assert (reference[["subbed_on", "subbed_off"]] == data[["subbed_on", "subbed_off"]]).all().all()
+        else:
+            old = f"{'-':>14}"
+        print(f"{len(data):>7} {vectorized * 1e3:>16.2f} {vectorized / len(data) * 1e9:>7.0f} {old}")
@@ -1,25 +1,44 @@
 from footballdashboardsdata.datasource import DataSource
-from dbconnect.connector import Connection
 import datetime as dt
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Callable, Union
+from typing import Dict, List, Callable, Tuple, Union
 from footballdashboardsdata.utils.queries import (
     get_decorated_league_name_from_fb_name,
     get_decorated_team_name_from_fb_name,
 )
 from abc import ABC, abstractmethod
+from footballdashboardsdata.utils.subclassing import SubclassRegistry
+from footballdashboardsdata.utils import possession_adjust
+from footballdashboardsdata.utils.intervals import on_pitch_totals
+from footballdashboardsdata.utils.ranking import RankingIndex
+from footballdashboardsdata.utils.assignment import max_weight_assignment
+from footballdashboardsdata.utils.caching import TTLCache
+from footballdashboardsdata.utils.connection import ConnectionProvider, get_connection_provider
 
 
 class FormationComposer(ABC):
+    _registry = SubclassRegistry("formation")
+
+    def __init__(self, optimal: bool = False):
+        self.optimal = optimal
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__name__.startswith("FormationComposer"):
+            FormationComposer._registry.register(cls.__name__[len("FormationComposer") :], cls)
+
     @classmethod
-    def get(cls, formation_name: str):
+    def get(cls, formation_name: str, optimal: bool = False):
         formation_name = formation_name.replace(" ", "").replace("-", "")
-        try:
-            subclass = next(c for c in cls.__subclasses__() if c.__name__ == f"FormationComposer{formation_name}")
-            return subclass()
-        except StopIteration as e:
-            raise ValueError(f"Invalid formation name: {formation_name}") from e
+        return FormationComposer._registry.get(formation_name)(optimal=optimal)
+
+    @classmethod
+    def get_formation_names(cls) -> List[str]:
+        return FormationComposer._registry.names()
 
     @classmethod
     @abstractmethod
@@ -33,6 +52,8 @@ class FormationComposer(ABC):
 
     def select_team(self, data: pd.DataFrame) -> pd.DataFrame:
         data["position"] = data["position"].apply(lambda x: x[0])
+        if self.optimal:
+            return self._select_team_optimal(data)
         gk_pool = data.loc[data["position"] == "GK"]
         selection = gk_pool.sort_values("total", ascending=False).head(1)
         team_selection = selection.copy()
@@ -44,6 +65,20 @@ class FormationComposer(ABC):
             team_selection = pd.concat([team_selection, selection])
         return team_selection
 
+    def _select_team_optimal(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Pick the XI with the highest summed ``total`` over the slots of
+        ``get_position_lists`` (plus a goalkeeper) as one linear assignment, instead of
+        filling slots greedily in order. A player listed for several squads is only
+        considered with their best row.
+        """
+        pool = data.sort_values("total", ascending=False, kind="stable").drop_duplicates("player")
+        slots = [["GK"]] + self.get_position_lists()
+        positions = pool["position"].to_numpy()
+        eligible = np.column_stack([np.isin(positions, slot) for slot in slots])
+        pairs = max_weight_assignment(pool["total"].to_numpy(), eligible)
+        return pool.iloc[[row for row, _ in pairs]]
+
     def place_team(self, data: pd.DataFrame) -> pd.DataFrame:
         data = data.reset_index()
         data["placement_position"] = ""
@@ -180,6 +215,78 @@ class FormationComposer433(FormationComposer):
         }
 
 
+class ScoreTable:
+    """
+    Read-only ``power_ranking_reference`` for one scoring mode, laid out as
+    (position x attribute) arrays so scoring is an indexed lookup.
+
+    Multi-leg ties zero out the scores for ``MULTI_LEG_ATTRIBUTES``, since match
+    results do not decide them.
+    """
+
+    MULTI_LEG_ATTRIBUTES = ["winning_goals", "opening_goals", "equalising_goals"]
+
+    def __init__(self, data: pd.DataFrame, multi_leg: bool = False, version: str = None):
+        data = data.copy()
+        if multi_leg:
+            data.loc[data["data_attribute"].isin(self.MULTI_LEG_ATTRIBUTES), "score"] = 0
+        self.multi_leg = multi_leg
+        self.version = version or self.content_version(data)
+        self._data = data
+
+        # unique() gives an extension array for string columns, which cannot be frozen
+        self.attributes = np.asarray(data["data_attribute"].unique(), dtype=object)
+        score_table = data.pivot(index="position", columns="data_attribute", values="score")
+        score_table = score_table.reindex(columns=self.attributes)
+        category_table = data.pivot(index="position", columns="data_attribute", values="data_category")
+        category_table = category_table.reindex(columns=self.attributes)
+        self.positions = score_table.index
+        self.scores = score_table.to_numpy(dtype=float)
+        self.categories = category_table.to_numpy()
+        self.present = category_table.notna().to_numpy() | score_table.notna().to_numpy()
+        for array in [self.attributes, self.scores, self.categories, self.present]:
+            array.setflags(write=False)
+
+    @staticmethod
+    def content_version(data: pd.DataFrame) -> str:
+        return format(int(pd.util.hash_pandas_object(data, index=False).sum()) & 0xFFFFFFFFFFFFFFFF, "016x")
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        return self._data.copy()
+
+
+SCORE_TABLE_TTL = 3600.0
+_SCORE_TABLE_CACHE = TTLCache(ttl=SCORE_TABLE_TTL, max_entries=8)
+# keeps the built tables of recent versions, so a reload of unchanged data reuses them
+_SCORE_TABLES_BY_VERSION = TTLCache(ttl=None, max_entries=4)
+
+
+def _load_score_tables(conn: ConnectionProvider) -> Dict[bool, ScoreTable]:
+    data = conn.query("SELECT * FROM power_ranking_reference")
+    version = ScoreTable.content_version(data)
+    return _SCORE_TABLES_BY_VERSION.get_or_load(
+        version,
+        lambda: {
+            False: ScoreTable(data, multi_leg=False, version=version),
+            True: ScoreTable(data, multi_leg=True, version=version),
+        },
+    )
+
+
+def get_score_tables(conn: ConnectionProvider = None) -> Dict[bool, ScoreTable]:
+    """
+    Single-leg (``False``) and multi-leg (``True``) score tables, re-read from the
+    database at most every ``SCORE_TABLE_TTL`` seconds.
+    """
+    conn = conn or get_connection_provider()
+    return _SCORE_TABLE_CACHE.get_or_load(conn, lambda: _load_score_tables(conn))
+
+
+def invalidate_score_tables():
+    _SCORE_TABLE_CACHE.invalidate()
+
+
 class BestEleventDataSource(DataSource):
     @classmethod
     def get_name(cls) -> str:
@@ -200,6 +307,42 @@ class BestEleventDataSource(DataSource):
         "dob",
     ]
 
+    # computed in _attach_sub_on_sub_off, _attach_team_goal_conceded and _attach_scores
+    DERIVED_COLS = [
+        "rank_position",
+        "subbed_on",
+        "subbed_off",
+        "team_goals_conceded",
+        "psxg",
+        "clean_sheets",
+        "save_pct",
+        "crosses_stopped_pct",
+        "pass_completed_pct",
+    ]
+
+    DERIVED_INPUT_COLS = [
+        "enriched_position",
+        "game_started",
+        "touches",
+        "psxg_gk",
+        "goals_conceded",
+        "shots_on_target_against",
+        "crosses_stopped_gk",
+        "crosses_gk",
+        "passes",
+        "passes_completed",
+    ]
+
+    SHOT_COLS = ["match_id", "squad", "minute"]
+
+    def _fbref_columns(self, scores: "ScoreTable") -> List[str]:
+        """
+        The ``fbref`` columns scoring needs: index columns, the score table's
+        attributes and the inputs of derived stats.
+        """
+        columns = self.INDEX_COLS + list(scores.attributes) + self.DERIVED_INPUT_COLS
+        return list(dict.fromkeys(c for c in columns if c not in self.DERIVED_COLS))
+
     def _get_seasons_data(
         self,
         league: str,
@@ -207,9 +350,11 @@ class BestEleventDataSource(DataSource):
         start_date: dt.date = None,
         end_date: dt.date = None,
         # dob: dt.date = None,
+        columns: List[str] = None,
     ) -> pd.DataFrame:
-        conn = Connection("M0neyMa$e")
-        sql = f"""SELECT * FROM fbref 
+        conn = self.conn
+        select = ", ".join(columns) if columns else "*"
+        sql = f"""SELECT {select} FROM fbref 
             WHERE comp = '{league}'
             AND season = {season}
             """
@@ -225,11 +370,14 @@ class BestEleventDataSource(DataSource):
 
         return data
 
-    def _get_shot_data(self, league: str, season: int, start_date: dt.date, end_date: dt.date) -> pd.DataFrame:
-        conn = Connection("M0neyMa$e")
+    def _get_shot_data(
+        self, league: str, season: int, start_date: dt.date, end_date: dt.date, columns: List[str] = None
+    ) -> pd.DataFrame:
+        conn = self.conn
+        select = ", ".join(columns) if columns else "*"
 
         query = f"""
-        SELECT * FROM football_data.fbref_shots 
+        SELECT {select} FROM football_data.fbref_shots 
         WHERE comp='{league}'
         AND season={season}
         AND outcome='Goal'
@@ -243,133 +391,147 @@ class BestEleventDataSource(DataSource):
         return data
 
     def _attach_sub_on_sub_off(self, data: pd.DataFrame):
-        data["subbed_on"] = data.apply(
-            lambda r: 0
-            if r["game_started"] == 1
-            else data.loc[data["match_id"] == r["match_id"]]["minutes"].max() - r["minutes"],
-            axis=1,
-        )
-        data["subbed_off"] = data.apply(
-            lambda r: data.loc[data["match_id"] == r["match_id"]]["minutes"].max()
-            if r["game_started"] == 0
-            else r["minutes"],
-            axis=1,
-        )
+        match_minutes = data.groupby("match_id")["minutes"].transform("max")
+        data["subbed_on"] = np.where(data["game_started"] == 1, 0, match_minutes - data["minutes"])
+        data["subbed_off"] = np.where(data["game_started"] == 0, match_minutes, data["minutes"])
 
     def _attach_team_goal_conceded(self, data: pd.DataFrame, shots: pd.DataFrame):
-        data["team_goals_conceded"] = data.apply(
-            lambda r: len(
-                shots.loc[
-                    (shots["match_id"] == r["match_id"])
-                    & (shots["squad"] != r["squad"])
-                    & (shots["minute"] > r["subbed_on"] if r["subbed_on"] > 0 else True)
-                    & (shots["minute"] <= r["subbed_off"])
-                ]
-            ),
-            axis=1,
+        # starters (subbed_on == 0) are charged with every goal up to subbed_off
+        starts = np.where(data["subbed_on"] > 0, data["subbed_on"], -np.inf)
+        data["team_goals_conceded"] = on_pitch_totals(
+            data, shots, starts, data["subbed_off"].to_numpy(), against=True
         )
 
+    def _get_score_table(self, multi_leg: bool = False) -> "ScoreTable":
+        return get_score_tables(self.conn)[multi_leg]
+
     def _get_scores(self, multi_leg: bool = False) -> pd.DataFrame:
-        conn = Connection("M0neyMa$e")
-        data = conn.query("SELECT * FROM power_ranking_reference")
-        if multi_leg:
-            data.loc[data["data_attribute"] == "winning_goals", "score"] = 0
-            data.loc[data["data_attribute"] == "opening_goals", "score"] = 0
-            data.loc[data["data_attribute"] == "equalising_goals", "score"] = 0
-        return data
+        return self._get_score_table(multi_leg).frame
+
+    RANK_POSITIONS = {
+        "LB": "FB",
+        "RB": "FB",
+        "WB": "FB",
+        "RWB": "FB",
+        "LWB": "FB",
+        "LW": "WFW",
+        "RW": "WFW",
+        "LM": "WFW",
+        "RM": "WFW",
+        "AM": "AMF",
+        "CM": "MF",
+        "DM": "MF",
+    }
+
+    # possession factor column -> attributes whose earned score it scales
+    ATTRIBUTE_ADJUSTMENTS = {
+        "raw_out_of_possession_factor": ["blocks", "interceptions", "clearances", "tackles_won", "dribbled_past"],
+    }
+
+    RANKING_STATS = {
+        "GK": ["shotstopping", "area_control", "distribution"],
+        "outfield": ["defending", "finishing", "providing", "progressing"],
+    }
+
+    SCORE_OUTPUT_COLS = [
+        "player",
+        "squad",
+        "opponent",
+        "date",
+        "comp",
+        "match_id",
+        "season",
+        "minutes",
+        "position",
+        "rank_position",
+        "week",
+        "dob",
+        "data_attribute",
+        "data_category",
+        "value",
+        "score",
+        "earned_score",
+    ]
 
     def _transform_position(self, position: str):
         pos = position.split(",")[0]
-        if pos in ["LB", "RB", "WB", "RWB", "LWB"]:
-            return "FB"
-        if pos in ["LW", "RW", "LM", "RM"]:
-            return "WFW"
-        if pos in ["AM"]:
-            return "AMF"
-        if pos in ["CM", "DM"]:
-            return "MF"
-        return pos
-
-    def _attach_scores(self, data, scores):
+        return self.RANK_POSITIONS.get(pos, pos)
+
+    def _attach_positions(self, data: pd.DataFrame):
+        # map the (few) distinct enriched positions rather than every row
+        enriched = data["enriched_position"].astype("category")
+        first_positions = {p: p.split(",")[0] for p in enriched.cat.categories}
+        rank_positions = {p: self.RANK_POSITIONS.get(f, f) for p, f in first_positions.items()}
+        data["rank_position"] = enriched.map(rank_positions).astype(object)
+        data["position"] = enriched.map(first_positions).astype(object)
+
+    @staticmethod
+    def _dob_dates(dob: pd.Series) -> pd.Series:
+        if pd.api.types.is_datetime64_any_dtype(dob):
+            return pd.Series(np.where(dob.notna(), dob.dt.date, dt.date(1900, 1, 1)), index=dob.index)
+        return dob.map(lambda x: x.to_pydatetime().date() if isinstance(x, pd.Timestamp) else dt.date(1900, 1, 1))
+
+    def _attach_scores(self, data, scores: "ScoreTable"):
         PASS_AVG_THRESHOLD = 0.75
-        data["rank_position"] = data["enriched_position"].apply(self._transform_position)
-        data["position"] = data["enriched_position"].apply(lambda x: x.split(",")[0])
+        self._attach_positions(data)
 
-        attributes = scores["data_attribute"].unique()
+        attributes = scores.attributes
 
+        goals_conceded = data["goals_conceded"].to_numpy(dtype=float)
+        shots_on_target_against = data["shots_on_target_against"].to_numpy(dtype=float)
+        passes = data["passes"].to_numpy(dtype=float)
         data["psxg"] = data["psxg_gk"] - data["goals_conceded"]
-        data["clean_sheets"] = data.apply(
-            lambda r: 1 if r["goals_conceded"] == 0 and r["shots_on_target_against"] >= 3 else 0, axis=1
-        )
-        data["save_pct"] = data.apply(
-            lambda r: max(0, r["shots_on_target_against"] - r["goals_conceded"]) / r["shots_on_target_against"]
-            if r["shots_on_target_against"] > 0
-            else 0,
-            axis=1,
-        ).fillna(0)
-        data["crosses_stopped_pct"] = (data["crosses_stopped_gk"] / data["crosses_gk"]).fillna(0)
-        data["pass_completed_pct"] = data.apply(
-            lambda x: 0 if x["passes"] <= 5 else x["passes_completed"] / x["passes"] - PASS_AVG_THRESHOLD, axis=1
-        )
-
-        data = data[self.INDEX_COLS + list(attributes)]
-        data = data.fillna(0)
-        data = data.set_index(self.INDEX_COLS)
-        data = data.stack().rename_axis(self.INDEX_COLS + ["var_name"]).rename("value").reset_index()
-        data = pd.merge(
-            data,
-            scores[["position", "data_attribute", "score", "data_category"]],
-            left_on=["rank_position", "var_name"],
-            right_on=["position", "data_attribute"],
-            suffixes=("", "_scores"),
-            how="inner",
-        )
-        data["earned_score"] = data["value"] * data["score"]
-        data = data[data["earned_score"] != 0]
-        data["dob"] = data["dob"].apply(
-            lambda x: x.to_pydatetime().date() if isinstance(x, pd.Timestamp) else dt.date(1900, 1, 1)
-        )
-        return data[
-            [
-                "player",
-                "squad",
-                "opponent",
-                "date",
-                "comp",
-                "match_id",
-                "season",
-                "minutes",
-                "position",
-                "rank_position",
-                "week",
-                "dob",
-                "data_attribute",
-                "data_category",
-                "value",
-                "score",
-                "earned_score",
-            ]
-        ]
+        data["clean_sheets"] = ((goals_conceded == 0) & (shots_on_target_against >= 3)).astype(int)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            data["save_pct"] = np.where(
+                shots_on_target_against > 0,
+                np.maximum(0, shots_on_target_against - goals_conceded) / shots_on_target_against,
+                0,
+            )
+            data["save_pct"] = data["save_pct"].fillna(0)
+            data["crosses_stopped_pct"] = (data["crosses_stopped_gk"] / data["crosses_gk"]).fillna(0)
+            data["pass_completed_pct"] = np.where(
+                passes <= 5,
+                0,
+                data["passes_completed"].to_numpy(dtype=float) / passes - PASS_AVG_THRESHOLD,
+            )
 
-    def _possession_adjust_factors(self, data: pd.DataFrame) -> Dict[str, float]:
-        touches_for = (
-            data.groupby(["squad", "match_id"])
-            .agg({"touches": "sum"})
-            .groupby("squad")
-            .agg({"touches": "mean"})
-            .reset_index()
-        )
-        touches_against = (
-            data.groupby(["opponent", "match_id"])
-            .agg({"touches": "sum"})
-            .groupby("opponent")
-            .agg({"touches": "mean"})
-            .reset_index()
-            .rename(columns={"opponent": "squad"})
-        )
-        merged = pd.merge(left=touches_for, right=touches_against, how="left", on="squad", suffixes=("", "_against"))
-        merged["padj_factor"] = 0.5 / (merged["touches_against"] / (merged["touches_against"] + merged["touches"]))
-        return merged.set_index("squad")["padj_factor"].to_dict()
+        # build the long (player-match, attribute) frame only for non-zero scores
+        index_data = data[self.INDEX_COLS].copy()
+        index_data["dob"] = self._dob_dates(index_data["dob"])
+        index_data = index_data.fillna(0)
+        values = data[list(attributes)].fillna(0).to_numpy(dtype=float)
+
+        position_codes = scores.positions.get_indexer(index_data["rank_position"])
+        known_position = position_codes >= 0
+        position_codes = np.where(known_position, position_codes, 0)
+        row_scores = scores.scores[position_codes]
+        with np.errstate(invalid="ignore"):
+            earned = values * row_scores
+        keep = scores.present[position_codes] & known_position[:, None] & (earned != 0)
+        rows, cols = np.nonzero(keep)
+
+        long_data = index_data.iloc[rows].reset_index(drop=True)
+        long_data["data_attribute"] = attributes[cols]
+        long_data["data_category"] = scores.categories[position_codes[rows], cols]
+        long_data["value"] = values[rows, cols]
+        long_data["score"] = row_scores[rows, cols]
+        long_data["earned_score"] = earned[rows, cols]
+        return long_data[self.SCORE_OUTPUT_COLS]
+
+    def _adjust_scores(self, full_scores: pd.DataFrame, raw_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scale ``earned_score`` of the attributes in ``ATTRIBUTE_ADJUSTMENTS`` by the
+        squad's factor from the matching possession factor column.
+        """
+        adjusted = full_scores.copy()
+        factors = possession_adjust.possession_factors(raw_data).set_index("squad")
+        multiplier = np.ones(len(adjusted))
+        for factor_col, attributes in self.ATTRIBUTE_ADJUSTMENTS.items():
+            mask = adjusted["data_attribute"].isin(attributes).to_numpy()
+            multiplier[mask] = adjusted.loc[mask, "squad"].map(factors[factor_col]).to_numpy(dtype=float)
+        adjusted["earned_score"] = adjusted["earned_score"] * multiplier
+        return adjusted
 
     def _pivot_ranking_data(self, data):
         data = (
@@ -393,104 +555,173 @@ class BestEleventDataSource(DataSource):
         else:
             return ""
 
-    def _attach_best_attributes_totw(self, totw: pd.DataFrame, full_scores: pd.DataFrame) -> pd.DataFrame:
-        total_stats = [
-            "goals",
-            "opening_goals",
-            "clean_sheets",
-            "equalising_goals",
-            "winning_goals",
-            "assists",
-            "pass_completed_pct",
-        ]
-        for i, r in totw.iterrows():
-            player_scores = full_scores.loc[
-                (full_scores["squad"] == r["squad"]) & (full_scores["player"] == r["player"])
-            ]
-            player_scores = (
-                player_scores.groupby(["data_attribute", "data_category"])
-                .agg({"earned_score": "sum", "value": "sum", "position": lambda x: x.value_counts().index.tolist()[0]})
-                .reset_index()
-            )
-            player_scores = player_scores.loc[~player_scores["data_attribute"].isin(["pass_completed_pct"])]
-            attributes = player_scores.sort_values("earned_score", ascending=False)
-            selected_attributes = []
-            j = 0
-            while len(selected_attributes) < 3:
-                r2 = attributes.iloc[j]
-
-                if (
-                    (r2["data_attribute"] == "save_pct" and r2["value"] == 1.0)
-                    or (
-                        r2["data_attribute"] == "goals"
-                        and len([sa for sa in selected_attributes if sa[0] in ["winning_goals", "equalising_goals"]])
-                        > 0
-                    )
-                    or (
-                        (r2["position"] in ["FB", "CB"])
-                        and len(selected_attributes) == 2
-                        and len([sa for sa in selected_attributes if sa[1] == "defending"]) == 0
-                        and r2["data_category"] != "defending"
-                    )
-                ):
-                    j += 1
-                    continue
-                if r2["data_attribute"] not in total_stats and r["matches"] > 1:
-                    value = r2["value"] / r["minutes"] * 90
-                    name = f"{r2['data_attribute']}_p90"
-                else:
-                    value = r2["value"]
-                    name = r2["data_attribute"]
+    TOTAL_STATS = [
+        "goals",
+        "opening_goals",
+        "clean_sheets",
+        "equalising_goals",
+        "winning_goals",
+        "assists",
+        "pass_completed_pct",
+    ]
 
-                selected_attributes.append((name, r2["data_category"], value))
-                j += 1
+    def _player_attribute_totals(self, full_scores: pd.DataFrame) -> pd.DataFrame:
+        """
+        ``full_scores`` summed per (squad, player, attribute, category) with the most
+        common position, sorted by squad, player and descending earned score.
+        """
+        keys = ["squad", "player", "data_attribute", "data_category"]
+        full_scores = full_scores.loc[~full_scores["data_attribute"].isin(["pass_completed_pct"])]
+        totals = full_scores.groupby(keys)[["earned_score", "value"]].sum()
+        position_counts = full_scores.groupby(keys + ["position"], sort=False).size().rename("n").reset_index()
+        modal_position = (
+            position_counts.sort_values("n", ascending=False, kind="stable")
+            .drop_duplicates(keys)
+            .set_index(keys)["position"]
+        )
+        totals["position"] = modal_position.reindex(totals.index)
+        return totals.reset_index().sort_values(
+            ["squad", "player", "earned_score"], ascending=[True, True, False], kind="stable"
+        ).reset_index(drop=True)
 
-            for k, (attr, _, val) in enumerate(selected_attributes):
-                totw.loc[i, f"top_category_{k+1}"] = attr
-                totw.loc[i, f"top_value_{k+1}"] = val
+    @staticmethod
+    def _select_top_attributes(
+        attributes: np.ndarray, categories: np.ndarray, values: np.ndarray, positions: np.ndarray, n: int = 3
+    ) -> List[int]:
+        selected = []
+        selected_attributes = []
+        selected_categories = []
+        for j in range(len(attributes)):
+            if len(selected) == n:
+                break
+            if (
+                (attributes[j] == "save_pct" and values[j] == 1.0)
+                or (
+                    attributes[j] == "goals"
+                    and any(sa in ["winning_goals", "equalising_goals"] for sa in selected_attributes)
+                )
+                or (
+                    (positions[j] in ["FB", "CB"])
+                    and len(selected) == n - 1
+                    and "defending" not in selected_categories
+                    and categories[j] != "defending"
+                )
+            ):
+                continue
+            selected.append(j)
+            selected_attributes.append(attributes[j])
+            selected_categories.append(categories[j])
+        return selected
+
+    def top_attributes(self, players: pd.DataFrame, full_scores: pd.DataFrame, n: int = 3) -> pd.DataFrame:
+        """
+        Best ``n`` attributes of each player in ``players`` (which needs squad, player,
+        matches and minutes), as ``top_category_k`` / ``top_value_k`` columns aligned
+        to ``players``. Counting stats become per 90 for players with several matches.
 
+        ``full_scores`` is aggregated once, so this scales to every player of a
+        matchweek rather than just one team.
+        """
+        selected_keys = players[["squad", "player"]].drop_duplicates()
+        full_scores = full_scores.merge(selected_keys, on=["squad", "player"])
+        totals = self._player_attribute_totals(full_scores)
+        # totals are sorted by player, so each player's rows are one contiguous slice
+        bounds = {
+            key: (idx[0], idx[-1] + 1) for key, idx in totals.groupby(["squad", "player"], sort=False).indices.items()
+        }
+
+        attributes = totals["data_attribute"].to_numpy()
+        categories = totals["data_category"].to_numpy()
+        values = totals["value"].to_numpy()
+        positions = totals["position"].to_numpy()
+
+        top = pd.DataFrame(index=players.index)
+        for i, squad, player, matches, minutes in zip(
+            players.index, players["squad"], players["player"], players["matches"], players["minutes"]
+        ):
+            start, end = bounds.get((squad, player), (0, 0))
+            picks = self._select_top_attributes(
+                attributes[start:end], categories[start:end], values[start:end], positions[start:end], n
+            )
+            for k, j in enumerate(picks):
+                j += start
+                if attributes[j] not in self.TOTAL_STATS and matches > 1:
+                    attr = f"{attributes[j]}_p90"
+                    value = values[j] / minutes * 90
+                else:
+                    attr = attributes[j]
+                    value = values[j]
+                top.loc[i, f"top_category_{k+1}"] = attr
+                top.loc[i, f"top_value_{k+1}"] = value
+        return top
+
+    def _attach_best_attributes_totw(self, totw: pd.DataFrame, full_scores: pd.DataFrame) -> pd.DataFrame:
+        top = self.top_attributes(totw, full_scores)
+        for c in top.columns:
+            totw[c] = top[c]
         return totw
 
-    def _attach_ranking(self, data, ranking_baseline_data):
-        for i, row in data.iterrows():
-            if row["position"] == "GK":
-                comparision = ranking_baseline_data[ranking_baseline_data["rank_position"] == "GK"]
-                stats = ["shotstopping", "area_control", "distribution"]
+    def ranking_index(self, ranking_baseline_data: pd.DataFrame) -> RankingIndex:
+        """
+        Percentile index over aggregated player scores: goalkeepers are ranked against
+        goalkeepers on ``RANKING_STATS["GK"]``, everyone else against outfield players.
+        """
+        groups = np.where(ranking_baseline_data["rank_position"] == "GK", "GK", "outfield")
+        return RankingIndex(ranking_baseline_data, groups, self.RANKING_STATS)
 
-            else:
-                comparision = ranking_baseline_data[ranking_baseline_data["rank_position"] != "GK"]
-                stats = ["defending", "finishing", "providing", "progressing"]
+    def rank_players(self, players: pd.DataFrame, ranking_index: RankingIndex) -> pd.DataFrame:
+        """
+        ``<stat>_ranking`` columns for any number of players, keyed by their ``position``.
+        """
+        groups = np.where(players["position"] == "GK", "GK", "outfield")
+        return ranking_index.rank(players, groups)
 
-            for stat in stats:
-                comp = comparision[comparision[stat] != 0].copy()
-                data.loc[i, f"{stat}_ranking"] = len(comp[comp[stat] < row[stat]]) / len(comp)
+    def _attach_ranking(self, data, ranking_baseline_data):
+        ranks = self.rank_players(data, self.ranking_index(ranking_baseline_data))
+        for c in ranks.columns:
+            data[c] = ranks[c]
 
-    def impl_get_data(
+    def _load_scored_season(
         self,
         league: str,
         season: int,
         start_date: dt.date = None,
         end_date: dt.date = None,
-        tag: str = None,
-        formation: str = "442",
         multi_leg: bool = False,
-        dob: dt.date = None,
-    ):
-        formation_composer = FormationComposer.get(formation)
-        raw_data = self._get_seasons_data(league, season, start_date, end_date)
-        shot_data = self._get_shot_data(league, season, start_date, end_date)
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Player-match rows and their (unadjusted) long-format scores for a date window.
+        Every step works within a match, so a wider window can be loaded once and
+        sliced by date afterwards.
+        """
+        scores = self._get_score_table(multi_leg=multi_leg)
+        raw_data = self._get_seasons_data(
+            league, season, start_date, end_date, columns=self._fbref_columns(scores)
+        )
+        shot_data = self._get_shot_data(league, season, start_date, end_date, columns=self.SHOT_COLS)
         self._attach_sub_on_sub_off(raw_data)
         self._attach_team_goal_conceded(raw_data, shot_data)
-        scores = self._get_scores(multi_leg=multi_leg)
         full_scores = self._attach_scores(raw_data, scores)
-        padj_full_scores = full_scores.copy()
-        padj_factors = self._possession_adjust_factors(raw_data)
-        for i, r in padj_full_scores.loc[
-            padj_full_scores["data_attribute"].isin(
-                ["blocks", "interceptions", "clearances", "tackles_won", "dribbled_past"]
-            )
-        ].iterrows():
-            padj_full_scores.loc[i, "earned_score"] = r["earned_score"] * padj_factors[r["squad"]]
+        return raw_data, full_scores
+
+    @staticmethod
+    def _date_mask(dates: pd.Series, start_date: dt.date = None, end_date: dt.date = None) -> np.ndarray:
+        dates = pd.to_datetime(dates, errors="coerce")
+        mask = np.ones(len(dates), dtype=bool)
+        if start_date:
+            mask &= (dates >= pd.Timestamp(start_date)).to_numpy()
+        if end_date:
+            mask &= (dates <= pd.Timestamp(end_date)).to_numpy()
+        return mask
+
+    def _select_best_eleven(
+        self,
+        raw_data: pd.DataFrame,
+        full_scores: pd.DataFrame,
+        formation_composer: FormationComposer,
+        dob: dt.date = None,
+    ) -> pd.DataFrame:
+        padj_full_scores = self._adjust_scores(full_scores, raw_data)
         data = self._pivot_ranking_data(padj_full_scores)
         data["matches"] = 1
         data["agg_position"] = self._aggregated_position(data)
@@ -535,11 +766,162 @@ class BestEleventDataSource(DataSource):
         best_11 = self._attach_best_attributes_totw(best_11, full_scores)
         best_11 = formation_composer.place_team(best_11)
         self._attach_ranking(best_11, aggregated)
+        return best_11
+
+    def _best_eleven_from_season(
+        self,
+        raw_data: pd.DataFrame,
+        full_scores: pd.DataFrame,
+        league: str,
+        season: int,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+        tag: str = None,
+        formation: str = "442",
+        dob: dt.date = None,
+        optimal_lineup: bool = False,
+    ) -> pd.DataFrame:
+        formation_composer = FormationComposer.get(formation, optimal=optimal_lineup)
+        if start_date or end_date:
+            raw_data = raw_data.loc[self._date_mask(raw_data["date"], start_date, end_date)]
+            full_scores = full_scores.loc[self._date_mask(full_scores["date"], start_date, end_date)]
+        best_11 = self._select_best_eleven(raw_data, full_scores, formation_composer, dob)
         best_11["season"] = season
         best_11["league"] = league
-        best_11["league_name"] = get_decorated_league_name_from_fb_name(league)
+        best_11["league_name"] = get_decorated_league_name_from_fb_name(league, self.conn)
         best_11["start_date"] = start_date
         best_11["end_date"] = end_date
         best_11["tag"] = tag
         best_11["formation"] = formation
         return best_11
+
+    def impl_get_data(
+        self,
+        league: str,
+        season: int,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+        tag: str = None,
+        formation: str = "442",
+        multi_leg: bool = False,
+        dob: dt.date = None,
+        optimal_lineup: bool = False,
+    ):
+        FormationComposer.get(formation)  # fail on an unknown formation before querying
+        raw_data, full_scores = self._load_scored_season(league, season, start_date, end_date, multi_leg)
+        return self._best_eleven_from_season(
+            raw_data,
+            full_scores,
+            league,
+            season,
+            tag=tag,
+            start_date=start_date,
+            end_date=end_date,
+            formation=formation,
+            dob=dob,
+            optimal_lineup=optimal_lineup,
+        )
+
+    def run_jobs(self, league: str, season: int, jobs: List[Dict], multi_leg: bool = False) -> List[Dict]:
+        """
+        Run several best eleven requests for one league-season off a single load.
+
+        Args:
+            league (str): league
+            season (int): season
+            jobs (List[Dict]): ``impl_get_data`` keyword arguments per job (start_date,
+                end_date, tag, formation, dob, optimal_lineup)
+            multi_leg (bool, optional): score table to use. Defaults to False.
+
+        Returns:
+            List[Dict]: per job, ``result`` (DataFrame or None), ``error`` (str or None)
+            and ``seconds`` spent on the job; the first job's seconds include the load.
+        """
+        started = time.perf_counter()
+        starts = [job.get("start_date") for job in jobs]
+        ends = [job.get("end_date") for job in jobs]
+        load_start = None if not all(starts) else min(starts)
+        load_end = None if not all(ends) else max(ends)
+        try:
+            raw_data, full_scores = self._load_scored_season(league, season, load_start, load_end, multi_leg)
+        except Exception as e:  # pylint: disable=broad-except
+            seconds = time.perf_counter() - started
+            return [{"result": None, "error": repr(e), "seconds": seconds} for _ in jobs]
+
+        results = []
+        for job in jobs:
+            try:
+                result = self._best_eleven_from_season(raw_data, full_scores, league, season, **job)
+                error = None
+            except Exception as e:  # pylint: disable=broad-except
+                result = None
+                error = repr(e)
+            finished = time.perf_counter()
+            results.append({"result": result, "error": error, "seconds": finished - started})
+            started = finished
+        return results
+
+    def get_data_batch(self, jobs: List[Dict], max_workers: int = 4) -> List[Dict]:
+        """
+        Run many best eleven requests, loading and scoring each (league, season,
+        multi_leg) once and slicing it per job.
+
+        League-seasons run in a pool of ``max_workers`` spawned processes, each
+        with a fresh copy of this data source's connection provider, so the
+        provider must be picklable (an in-memory SQLite provider is not). Spawned
+        workers import the caller's main module, so call this under
+        ``if __name__ == "__main__":`` in scripts. ``max_workers <= 1`` runs
+        everything in this process.
+
+        Args:
+            jobs (List[Dict]): ``impl_get_data`` keyword arguments per job; ``league``
+                and ``season`` are required.
+            max_workers (int, optional): concurrent league-seasons. Defaults to 4.
+
+        Returns:
+            List[Dict]: per job, in order, the job itself plus ``result``, ``error``
+            and ``seconds``
+        """
+        groups: Dict[Tuple, List[int]] = {}
+        for i, job in enumerate(jobs):
+            key = (job["league"], job["season"], job.get("multi_leg", False))
+            groups.setdefault(key, []).append(i)
+
+        def group_jobs(indices):
+            return [
+                {k: v for k, v in jobs[i].items() if k not in ["league", "season", "multi_leg"]} for i in indices
+            ]
+
+        results: List[Dict] = [None] * len(jobs)
+        if max_workers <= 1:
+            for (league, season, multi_leg), indices in groups.items():
+                group_results = self.run_jobs(league, season, group_jobs(indices), multi_leg)
+                for i, r in zip(indices, group_results):
+                    results[i] = {"job": jobs[i], **r}
+            return results
+
+        # spawn rather than fork: a forked child could inherit a cache lock held by
+        # another thread mid-load and block on it forever
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {
+                executor.submit(
+                    _run_best_eleven_jobs, self.connection_provider, league, season, group_jobs(indices), multi_leg
+                ): indices
+                for (league, season, multi_leg), indices in groups.items()
+            }
+            for future in as_completed(futures):
+                indices = futures[future]
+                try:
+                    group_results = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    group_results = [{"result": None, "error": repr(e), "seconds": None} for _ in indices]
+                for i, r in zip(indices, group_results):
+                    results[i] = {"job": jobs[i], **r}
+        return results
+
+
+def _run_best_eleven_jobs(
+    connection_provider: ConnectionProvider, league: str, season: int, jobs: List[Dict], multi_leg: bool
+) -> List[Dict]:
+    # module level so it can be pickled into pool workers
+    return BestEleventDataSource(connection_provider).run_jobs(league, season, jobs, multi_leg)
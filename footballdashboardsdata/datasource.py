@@ -1,8 +1,29 @@
 from abc import ABC, abstractmethod
-from footballdashboardsdata.utils.subclassing import get_all_subclasses
+from typing import List
+from footballdashboardsdata.utils.subclassing import SubclassRegistry
+from footballdashboardsdata.utils.connection import (
+    ConnectionProvider,
+    get_connection_provider,
+)
 
 
 class DataSource(ABC):
+    _registry = SubclassRegistry("data requester")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "get_name" in cls.__dict__:
+            name = cls.get_name()
+            if name is not None:
+                DataSource._registry.register(name, cls)
+
+    def __init__(self, connection_provider: ConnectionProvider = None):
+        self.connection_provider = connection_provider or get_connection_provider()
+
+    @property
+    def conn(self) -> ConnectionProvider:
+        return self.connection_provider
+
     @classmethod
     @abstractmethod
     def get_name(cls) -> str:
@@ -26,25 +47,44 @@ class DataSource(ABC):
         """
 
     @classmethod
-    def get_data(cls, data_requester_name: str, **kwargs):
+    def get_data(
+        cls,
+        data_requester_name: str,
+        connection_provider: ConnectionProvider = None,
+        **kwargs,
+    ):
         """
         Get data from the data source.
 
         Args:
             data_requester_name (str): _description_
+            connection_provider (ConnectionProvider): pool used for database access,
+                defaults to the process-wide provider
             **kwargs: _description_
 
         Returns:
             _description_
         """
-        try:
-            subclass = next(
-                c
-                for c in get_all_subclasses(cls)
-                if c.get_name() == data_requester_name
-            )
-            return subclass().impl_get_data(**kwargs)
-        except StopIteration as e:
-            raise ValueError(
-                f"Invalid data requester name: {data_requester_name}"
-            ) from e
+        subclass = cls.get_class(data_requester_name)
+        return subclass(connection_provider).impl_get_data(**kwargs)
+
+    @classmethod
+    def get_class(cls, data_requester_name: str) -> type:
+        """
+        Look up a registered data source class by name.
+
+        Raises:
+            ValueError: if no data source is registered under the name
+        """
+        subclass = DataSource._registry.get(data_requester_name)
+        if not issubclass(subclass, cls):
+            raise ValueError(f"Invalid data requester name: {data_requester_name}")
+        return subclass
+
+    @classmethod
+    def get_registered_names(cls) -> List[str]:
+        return [
+            name
+            for name, subclass in DataSource._registry.items().items()
+            if issubclass(subclass, cls)
+        ]
@@ -1,6 +1,6 @@
 import pandas as pd
 from abc import ABC, abstractmethod
-from footballdashboardsdata.utils.subclassing import get_all_subclasses
+from footballdashboardsdata.utils.subclassing import SubclassRegistry
 from dbconnect.connector import Connection
 from footmav.data_definitions.whoscored.constants import EventType
 
@@ -108,6 +108,15 @@ def get_dataframe_for_match(match_id: int, conn: Connection):
 
 
 class Funnel(ABC):
+    _registry = SubclassRegistry("data requester")
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "get_name" in cls.__dict__:
+            name = cls.get_name()
+            if name is not None:
+                Funnel._registry.register(name, cls)
+
     @classmethod
     @abstractmethod
     def apply(cls, df: pd.DataFrame, **kwargs):
@@ -167,12 +176,5 @@ class DataFrameFunnelDataSource:
     def get_data(self, data_source_name: str, **kwargs):
         # Find the appropriate funnel class and run the
         # data through the apply method
-        try:
-            subclass = next(
-                c
-                for c in get_all_subclasses(Funnel)
-                if c.get_name() == data_source_name
-            )
-            return subclass.apply(self.df, **kwargs)
-        except StopIteration as e:
-            raise ValueError(f"Invalid data requester name: {data_source_name}") from e
+        subclass = Funnel._registry.get(data_source_name)
+        return subclass.apply(self.df, **kwargs)
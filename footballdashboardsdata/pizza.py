@@ -1,11 +1,12 @@
-from dbconnect.connector import Connection
 import pandas as pd
 import datetime as dt
-from typing import List
+from typing import Dict, List, Tuple
 from footmav import FbRefData, fb, aggregate_by, filter, filters, Filter, per_90
 from footmav.operations.possession_adjust import possession_adjust
 from footballdashboardsdata.datasource import DataSource
 from footballdashboardsdata.utils import possession_adjust
+from footballdashboardsdata.utils.caching import FrameCache
+from footballdashboardsdata.utils.subclassing import get_all_subclasses
 from footballmodels.definitions.templates import (
     MFTemplate,
     CBTemplate,
@@ -22,8 +23,10 @@ import numpy as np
 from footballdashboardsdata.utils.queries import (
     get_decorated_team_name_from_fb_name,
     get_multiple_decorated_league_names_from_fb_names,
+    get_name_lookup,
 )
 
+import inspect
 from abc import abstractmethod
 from footmav.data_definitions.base import IntDataAttribute
 from footmav.data_definitions.data_sources import DataSource as DataSourceEnum
@@ -40,6 +43,56 @@ if not "self_created_shots" in [
     )
 
 
+def date_label(start_date: dt.date = None, end_date: dt.date = None) -> str:
+    if start_date and end_date:
+        return f"{start_date.strftime('%d %b, %Y')} - {end_date.strftime('%d %b, %Y')}"
+    elif start_date:
+        return f"from {start_date.strftime('%d %b, %Y')}"
+    elif end_date:
+        return f"until {end_date.strftime('%d %b, %Y')}"
+    else:
+        return ""
+
+
+def format_value_strings(values: pd.Series, sig_figs: int) -> pd.Series:
+    """
+    Vectorized equivalent of ``values.apply(lambda x: f"{x:.{sig_figs}f}")``.
+    """
+    return pd.Series(
+        np.char.mod(f"%.{sig_figs}f", values.to_numpy(dtype=float)),
+        index=values.index,
+        dtype=object,
+    )
+
+
+def compute_template_values(
+    data: pd.DataFrame, template: List[TemplateAttribute], format_values: bool = True
+) -> Tuple[Dict[str, pd.Series], Dict[str, pd.Series]]:
+    """
+    Evaluate every template attribute once and rank it.
+
+    Returns:
+        Tuple[Dict[str, pd.Series], Dict[str, pd.Series]]: ``{name}__value`` columns
+        (formatted strings, or the raw numbers when ``format_values`` is False) and
+        the percentile rank columns keyed by attribute name.
+    """
+    data_value = {}
+    data_rank = {}
+    for attrib in template:
+        values = attrib.calculation(data)
+        data_value[f"{attrib.name}__value"] = (
+            format_value_strings(values, attrib.sig_figs) if format_values else values
+        )
+        data_rank[attrib.name] = values.rank(
+            pct=True, method="min", ascending=attrib.ascending_rank
+        )
+    return data_value, data_rank
+
+
+# fbref league-season scans shared by every pizza template (and radars built on them)
+_SEASON_FRAME_CACHE = FrameCache(max_bytes=1024 * 1024 * 1024, max_entries=16)
+
+
 class PizzaDataSource(DataSource):
     @abstractmethod
     def get_template(self) -> List[TemplateAttribute]:
@@ -49,88 +102,57 @@ class PizzaDataSource(DataSource):
     def get_comparison_positions(self) -> List[str]:
         pass
 
-    def _specific_position_impl(self, data: pd.DataFrame) -> dict:
-        data_value = {
-            f"{attrib.name}__value": attrib.calculation(data).apply(
-                lambda x: f"{x:.{attrib.sig_figs}f}"
-            )
-            for attrib in self.get_template()
-        }
-        data_rank = {
-            attrib.name: attrib.calculation(data).rank(
-                pct=True, method="min", ascending=attrib.ascending_rank
-            )
-            for attrib in self.get_template()
-        }
+    def _specific_position_impl(
+        self, data: pd.DataFrame, format_values: bool = True
+    ) -> dict:
+        data_value, data_rank = compute_template_values(
+            data, self.get_template(), format_values
+        )
         return {**data_value, **data_rank}
 
-    def get_data_dict(self, data):
-        specific_data = self._specific_position_impl(data)
-        data_dict = {
-            "Player": data[fb.PLAYER.N].tolist(),
-            "player_id": data[fb.PLAYER_ID.N].tolist(),
-            "Team": data[fb.TEAM.N].tolist(),
-            "Minutes": data[fb.MINUTES.N].tolist(),
-            "Competition": data[fb.COMPETITION.N].tolist(),
-            "Season": data[fb.YEAR.N].tolist(),
-        }
-        data_dict.update(specific_data)
-        return data_dict
-
-    def _get_decorated_team_name(self, team_name: str, gender: str) -> str:
-        query = f"""
-        SELECT decorated_name FROM mclachbot_teams WHERE team_name = '{team_name}'
-        AND gender='{gender}'
-        """
-        result = Connection("M0neyMa$e").query(query)
-        if len(result) == 0:
-            return team_name
-        return result["decorated_name"].values[0]
+    BASE_COLUMNS = [
+        fb.PLAYER_ID.N,
+        fb.PLAYER.N,
+        fb.DATE.N,
+        fb.TEAM.N,
+        fb.OPPONENT.N,
+        fb.MINUTES.N,
+        fb.COMPETITION.N,
+        fb.YEAR.N,
+        fb.ENRICHED_POSITION.N,
+        fb.TOUCHES.N,
+        "gender",
+        "match_id",
+        "dob",
+    ]
+
+    @staticmethod
+    def _template_columns(template: List[TemplateAttribute]) -> List[str]:
+        return list(
+            dict.fromkeys(col for attr in template for col in attr.columns_used)
+        )
 
-    def _get_decorated_league_name(self, league_name: str) -> str:
-        query = f"""
-        SELECT decorated_name FROM mclachbot_leagues WHERE league_name = '{league_name}'
-        """
-        result = Connection("M0neyMa$e").query(query)
-        if len(result) == 0:
-            return league_name
-        return result["decorated_name"].values[0]
+    def _all_pizza_template_columns(self) -> List[str]:
+        templates = [
+            c(self.connection_provider).get_template()
+            for c in get_all_subclasses(PizzaDataSource)
+            if not inspect.isabstract(c)
+        ]
+        return list(
+            dict.fromkeys(col for t in templates for col in self._template_columns(t))
+        )
 
-    def impl_get_data(
+    def _query_fbref(
         self,
-        player_id: str,
+        columns: List[str],
         leagues: List[str],
-        team: str,
         season: int,
-        use_all_minutes: bool = False,
-        filter_to_player: bool = True,
-        start_date: dt.date = None,
-        end_date: dt.date = None,
+        start_date: dt.date,
+        end_date: dt.date,
     ) -> pd.DataFrame:
-        template = self.get_template()
-        all_template_columns = [attr.columns_used for attr in template]
-        all_template_columns = [
-            item for sublist in all_template_columns for item in sublist
-        ]
-        all_template_columns = list(set(all_template_columns))
-        all_columns = [
-            "T1." + fb.PLAYER_ID.N,
-            "T1." + fb.PLAYER.N,
-            "T1." + fb.DATE.N,
-            "T1." + fb.TEAM.N,
-            "T1." + fb.OPPONENT.N,
-            "T1." + fb.MINUTES.N,
-            "T1." + fb.COMPETITION.N,
-            "T1." + fb.YEAR.N,
-            "T1." + fb.ENRICHED_POSITION.N,
-            "T1." + fb.TOUCHES.N,
-            "T1.gender",
-            "T1.match_id",
-            "T1.dob",
-        ] + all_template_columns
         league_str = ",".join([f"'{league}'" for league in leagues])
         query = f"""
-        SELECT {','.join(all_columns)}
+        SELECT {','.join(["T1." + c for c in columns])}
         FROM football_data.fbref T1
         
         WHERE T1.comp in ({league_str}) AND T1.season = {season}
@@ -139,18 +161,49 @@ class PizzaDataSource(DataSource):
             query += f" AND T1.date >= '{start_date}'"
         if end_date is not None:
             query += f" AND T1.date <= '{end_date}'"
-        conn = Connection("M0neyMa$e")
-        orig_df = conn.query(query)
-        all_match_ids = orig_df["match_id"].unique()
-        all_match_ids_string = ",".join([f"'{i}'" for i in all_match_ids])
+        return self.conn.query(query)
+
+    def _query_shot_aggregations(
+        self, leagues: List[str], season: int, match_ids: List[str]
+    ) -> pd.DataFrame:
+        league_str = ",".join([f"'{league}'" for league in leagues])
+        all_match_ids_string = ",".join([f"'{i}'" for i in match_ids])
         shot_agg_data_query = f"""
         SELECT * FROM derived.fbref_shot_aggregations T1
         WHERE
         T1.comp in ({league_str}) AND T1.season = {season}
         AND T1.match_id in ({all_match_ids_string})
         """
+        return self.conn.query(shot_agg_data_query)
 
-        shot_agg_data = conn.query(shot_agg_data_query)
+    def _get_season_frame(
+        self,
+        leagues: List[str],
+        season: int,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+    ) -> pd.DataFrame:
+        """
+        fbref rows for the league-season (joined to the shot aggregations) with the
+        columns this template needs. The underlying scans are cached and shared by
+        every pizza template, fetching the column superset of all of them on a miss.
+        """
+        key = (self.conn, tuple(sorted(leagues)), season, start_date, end_date)
+        columns = list(
+            dict.fromkeys(self.BASE_COLUMNS + self._template_columns(self.get_template()))
+        )
+        orig_df = _SEASON_FRAME_CACHE.get_or_load(
+            ("fbref",) + key,
+            lambda cols: self._query_fbref(cols, leagues, season, start_date, end_date),
+            columns=columns,
+            load_columns=self.BASE_COLUMNS + self._all_pizza_template_columns(),
+        )
+        shot_agg_data = _SEASON_FRAME_CACHE.get_or_load(
+            ("fbref_shot_aggregations",) + key,
+            lambda _: self._query_shot_aggregations(
+                leagues, season, orig_df["match_id"].unique()
+            ),
+        )
         orig_df = pd.merge(
             orig_df,
             shot_agg_data,
@@ -158,12 +211,61 @@ class PizzaDataSource(DataSource):
             how="left",
             suffixes=("", "_y"),
         )
-        orig_df = orig_df.drop(
-            [col for col in orig_df.columns if col.endswith("_y")], axis=1
-        )
-        gender = orig_df["gender"].iloc[0]
+        return orig_df.drop([col for col in orig_df.columns if col.endswith("_y")], axis=1)
+
+    def get_data_dict(self, data, format_values: bool = True):
+        specific_data = self._specific_position_impl(data, format_values)
+        data_dict = {
+            "Player": data[fb.PLAYER.N].tolist(),
+            "player_id": data[fb.PLAYER_ID.N].tolist(),
+            "Team": data[fb.TEAM.N].tolist(),
+            "Minutes": data[fb.MINUTES.N].tolist(),
+            "Competition": data[fb.COMPETITION.N].tolist(),
+            "Season": data[fb.YEAR.N].tolist(),
+        }
+        data_dict.update(specific_data)
+        return data_dict
+
+    def _get_decorated_team_name(self, team_name: str, gender: str) -> str:
+        return get_name_lookup(self.conn).team_name(team_name, gender, default=team_name)
+
+    def _get_decorated_league_name(self, league_name: str) -> str:
+        return get_name_lookup(self.conn).league_name(league_name, default=league_name)
+
+    def _possession_factors(
+        self,
+        orig_df: pd.DataFrame,
+        season: int,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+    ) -> pd.DataFrame:
+        store = possession_adjust.get_possession_factor_store()
+        if store is None or start_date is not None or end_date is not None:
+            return possession_adjust.adj_possession_factors(orig_df)
+        # full seasons are served from the configured, incrementally updated store
+        store.update(orig_df)
+        factors = store.factors(orig_df[fb.COMPETITION.N].unique(), [season])
+        return factors[
+            [
+                fb.COMPETITION.N,
+                fb.TEAM.N,
+                fb.YEAR.N,
+                "in_possession_factor",
+                "out_of_possession_factor",
+            ]
+        ]
+
+    def _prepare_season_data(
+        self,
+        leagues: List[str],
+        season: int,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+    ) -> pd.DataFrame:
+        template = self.get_template()
+        orig_df = self._get_season_frame(leagues, season, start_date, end_date)
 
-        adjust_factors = possession_adjust.adj_possession_factors(orig_df)
+        adjust_factors = self._possession_factors(orig_df, season, start_date, end_date)
         orig_df = orig_df.merge(
             adjust_factors, on=[fb.COMPETITION.N, fb.TEAM.N, fb.YEAR.N], how="left"
         )
@@ -181,16 +283,13 @@ class PizzaDataSource(DataSource):
                             orig_df[col] * orig_df["out_of_possession_factor"]
                         )
                         adjusted_columns.append(col)
+        return orig_df
 
-        fbref_data = FbRefData(orig_df)
-
-        non_position_restricted_player_data = (
-            fbref_data.pipe(aggregate_by, [fb.PLAYER_ID, fb.TEAM]).pipe(per_90).df
-        )
-        non_pos_resetricted_player_df = non_position_restricted_player_data[
-            non_position_restricted_player_data[fb.PLAYER_ID.N] == player_id
-        ]
-
+    def _comparison_data(self, fbref_data: FbRefData) -> Tuple[FbRefData, pd.DataFrame]:
+        """
+        Per 90 aggregates of everyone in the comparison positions, and the subset
+        that played at least a third of the most-used player's minutes.
+        """
         transformed_data = (
             fbref_data.pipe(
                 filter,
@@ -216,6 +315,70 @@ class PizzaDataSource(DataSource):
                 )
             ],
         ).df
+        return transformed_data, df
+
+    def _finalize_output(
+        self,
+        output: pd.DataFrame,
+        orig_df: pd.DataFrame,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+    ) -> pd.DataFrame:
+        """
+        Attach age, decorated names and labels to pizza output rows.
+        """
+        output = output.copy()
+        gender = orig_df["gender"].iloc[0]
+        dobs = (
+            orig_df.drop_duplicates([fb.PLAYER_ID.N, fb.TEAM.N])
+            .set_index([fb.PLAYER_ID.N, fb.TEAM.N])["dob"]
+            .reindex(pd.MultiIndex.from_arrays([output["player_id"], output["Team"]]))
+        )
+        ages = ((orig_df[fb.DATE.N].max() - dobs).dt.days / 365).to_numpy()
+        output["Age"] = [
+            int(age) if dob != pd.Timestamp(1900, 1, 1) else None
+            for dob, age in zip(dobs.to_numpy(), ages)
+        ]
+        output["image_team"] = output["Team"]
+        output["image_league"] = output["Competition"]
+        lookup = get_name_lookup(self.conn)
+        output["Team"] = (
+            lookup.team_names(output["Team"], gender).fillna(output["Team"]).to_numpy()
+        )
+        output["Competition"] = (
+            lookup.league_names(output["Competition"])
+            .fillna(output["Competition"])
+            .to_numpy()
+        )
+        output["All Competitions"] = ",".join(
+            orig_df[fb.COMPETITION.N].unique().tolist()
+        )
+        output["DateLabel"] = date_label(start_date, end_date)
+        return output
+
+    def impl_get_data(
+        self,
+        player_id: str,
+        leagues: List[str],
+        team: str,
+        season: int,
+        use_all_minutes: bool = False,
+        filter_to_player: bool = True,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+        format_values: bool = True,
+    ) -> pd.DataFrame:
+        orig_df = self._prepare_season_data(leagues, season, start_date, end_date)
+        fbref_data = FbRefData(orig_df)
+
+        non_position_restricted_player_data = (
+            fbref_data.pipe(aggregate_by, [fb.PLAYER_ID, fb.TEAM]).pipe(per_90).df
+        )
+        non_pos_resetricted_player_df = non_position_restricted_player_data[
+            non_position_restricted_player_data[fb.PLAYER_ID.N] == player_id
+        ]
+
+        transformed_data, df = self._comparison_data(fbref_data)
         if (
             df.loc[(df[fb.PLAYER_ID.N] == player_id) & (df[fb.TEAM.N] == team)].shape[0]
             == 0
@@ -231,44 +394,51 @@ class PizzaDataSource(DataSource):
 
             df = pd.concat([df, non_pos_resetricted_player_df])
 
-        data_dict = self.get_data_dict(df)
+        data_dict = self.get_data_dict(df, format_values)
         output = pd.DataFrame(data_dict)
         if not filter_to_player:
             return output
         output_row = output.loc[
             (output["player_id"] == player_id) & (output["Team"] == team)
-        ].copy()
-        player_dob = orig_df.loc[
-            (orig_df[fb.PLAYER_ID.N] == player_id) & (orig_df[fb.TEAM.N] == team), "dob"
-        ].iloc[0]
-        if player_dob != pd.Timestamp(1900, 1, 1):
-            output_row["Age"] = int((max(orig_df[fb.DATE.N]) - player_dob).days / 365)
-        else:
-            output_row["Age"] = None
-        output_row["image_team"] = output_row["Team"]
-        output_row["image_league"] = output_row["Competition"]
-        output_row["Team"] = self._get_decorated_team_name(
-            output_row["Team"].iloc[0], gender
-        )
-        output_row["Competition"] = self._get_decorated_league_name(
-            output_row["Competition"].iloc[0]
-        )
-        output_row["All Competitions"] = ",".join(
-            orig_df[fb.COMPETITION.N].unique().tolist()
-        )
-        if start_date and end_date:
-            date_label = (
-                f"{start_date.strftime('%d %b, %Y')} - {end_date.strftime('%d %b, %Y')}"
-            )
-        elif start_date:
-            date_label = f"from {start_date.strftime('%d %b, %Y')}"
-        elif end_date:
-            date_label = f"until {end_date.strftime('%d %b, %Y')}"
-        else:
-            date_label = ""
-        output_row["DateLabel"] = date_label
+        ]
+        return self._finalize_output(output_row, orig_df, start_date, end_date)
 
-        return output_row
+    def get_data_batch(
+        self,
+        leagues: List[str],
+        season: int,
+        player_ids: List[str] = None,
+        start_date: dt.date = None,
+        end_date: dt.date = None,
+        format_values: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Finished pizza rows for every qualifying player of the league-season from a
+        single aggregation and ranking pass.
+
+        Rows match what ``impl_get_data`` returns for a player who meets the minutes
+        threshold. Players below it are not part of the ranked pool and are omitted;
+        request those individually.
+
+        Args:
+            leagues (List[str]): leagues making up the comparison pool
+            season (int): season
+            player_ids (List[str], optional): restrict the output to these players.
+                Defaults to every qualifying player.
+            start_date (dt.date, optional): start of the date window
+            end_date (dt.date, optional): end of the date window
+            format_values (bool, optional): format ``__value`` columns as strings.
+                Pass False to keep the numbers and format in the renderer.
+
+        Returns:
+            pd.DataFrame: one row per qualifying (player, team)
+        """
+        orig_df = self._prepare_season_data(leagues, season, start_date, end_date)
+        _, df = self._comparison_data(FbRefData(orig_df))
+        output = pd.DataFrame(self.get_data_dict(df, format_values))
+        if player_ids is not None:
+            output = output.loc[output["player_id"].isin(player_ids)]
+        return self._finalize_output(output, orig_df, start_date, end_date)
 
 
 class MidfieldPizzaDataSource(PizzaDataSource):
@@ -437,25 +607,17 @@ class TeamPizzaDataSource(DataSource):
     def get_template(self) -> List[TemplateAttribute]:
         return TeamTemplate
 
-    def _specific_position_impl(self, data: pd.DataFrame) -> dict:
-        data_rank = {
-            attrib.name: attrib.calculation(data).rank(
-                pct=True, method="min", ascending=attrib.ascending_rank
-            )
-            # attrib.name: attrib.calculation(data)
-            for attrib in self.get_template()
-        }
-        data_value = {
-            f"{attrib.name}__value": attrib.calculation(data).apply(
-                lambda x: f"{x:.{attrib.sig_figs}f}"
-            )
-            for attrib in self.get_template()
-        }
+    def _specific_position_impl(
+        self, data: pd.DataFrame, format_values: bool = True
+    ) -> dict:
+        data_value, data_rank = compute_template_values(
+            data, self.get_template(), format_values
+        )
 
         return {**data_rank, **data_value}
 
-    def get_data_dict(self, data):
-        specific_data = self._specific_position_impl(data)
+    def get_data_dict(self, data, format_values: bool = True):
+        specific_data = self._specific_position_impl(data, format_values)
         data_dict = {
             "Team": data[fb.TEAM.N].tolist(),
             "Competition": data[fb.COMPETITION.N].tolist(),
@@ -466,7 +628,7 @@ class TeamPizzaDataSource(DataSource):
 
     def _get_shots_data(self, match_ids: List[str]) -> pd.DataFrame:
         match_ids_str = "'" + "','".join(match_ids) + "'"
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
 
         query = f"""
             SELECT 
@@ -513,8 +675,9 @@ class TeamPizzaDataSource(DataSource):
         team: str,
         start_date: dt.date = None,
         end_date: dt.date = None,
+        format_values: bool = True,
     ) -> pd.DataFrame:
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
 
         template = self.get_template()
         all_template_columns = [attr.columns_used for attr in template]
@@ -558,10 +721,10 @@ class TeamPizzaDataSource(DataSource):
             how="outer",
         )
         data_combined = data_combined.fillna(0)
-        data_dict = self.get_data_dict(data_combined)
+        data_dict = self.get_data_dict(data_combined, format_values)
         output = pd.DataFrame(data_dict)
         decorated_league_names = get_multiple_decorated_league_names_from_fb_names(
-            leagues
+            leagues, self.conn
         )
         output = output[output["Team"] == team]
         output["All Leagues"] = ", ".join(decorated_league_names.values())
@@ -569,19 +732,9 @@ class TeamPizzaDataSource(DataSource):
             lambda x: decorated_league_names[x]
         )
         output["Decorated Team"] = get_decorated_team_name_from_fb_name(
-            team, output["Competition"].tolist()[0]
+            team, output["Competition"].tolist()[0], self.conn
         )
-        if start_date and end_date:
-            date_label = (
-                f"{start_date.strftime('%d %b, %Y')} - {end_date.strftime('%d %b, %Y')}"
-            )
-        elif start_date:
-            date_label = f"from {start_date.strftime('%d %b, %Y')}"
-        elif end_date:
-            date_label = f"until {end_date.strftime('%d %b, %Y')}"
-        else:
-            date_label = ""
-        output["DateLabel"] = date_label
+        output["DateLabel"] = date_label(start_date, end_date)
         return output
 
 
@@ -596,25 +749,20 @@ class BuildUpIndexPizzaDataSource(PizzaDataSource):
     def get_template(self) -> List[TemplateAttribute]:
         return BuildUpIndexTemplate
 
-    def _specific_position_impl(self, data: pd.DataFrame) -> dict:
-        data_value = {
-            f"{attrib.name}__value": attrib.calculation(data).apply(
-                lambda x: f"{x:.{attrib.sig_figs}f}"
-            )
-            for attrib in self.get_template()
-        }
-        data_rank = {
-            attrib.name: attrib.calculation(data).rank(
-                pct=True, method="min", ascending=attrib.ascending_rank
-            )
-            for attrib in self.get_template()
-        }
+    def _specific_position_impl(
+        self, data: pd.DataFrame, format_values: bool = True
+    ) -> dict:
+        data_value, data_rank = compute_template_values(
+            data, self.get_template(), format_values
+        )
         d = {**data_value, **data_rank}
         d["Build Up Score"] = (
             sum([d[t.name] for t in self.get_template()])
             / np.sqrt(len(self.get_template()))
         ).rank(pct=True, method="min")
-        d["Build Up Score__value"] = (d["Build Up Score"] * 100).apply(
-            lambda x: f"{x:.0f}"
-        )
+        d["Build Up Score__value"] = d["Build Up Score"] * 100
+        if format_values:
+            d["Build Up Score__value"] = format_value_strings(
+                d["Build Up Score__value"], 0
+            )
         return d
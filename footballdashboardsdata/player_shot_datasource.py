@@ -1,5 +1,4 @@
 from footballdashboardsdata.datasource import DataSource
-from dbconnect.connector import Connection
 from footmav.utils.whoscored_funcs import (
     minutes,
     in_rectangle,
@@ -19,7 +18,7 @@ class PlayerShotDatasource(DataSource):
     def _minutes_played(
         self, season: int, competition: str, team: str, player_id: int
     ) -> int:
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
         data = conn.query(
             f"""
             SELECT * FROM whoscored T1
@@ -38,7 +37,7 @@ class PlayerShotDatasource(DataSource):
     def _get_player_id(
         self, season: int, competition: str, team: str, player: str
     ) -> int:
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
         data = conn.query(
             f"""
             SELECT DISTINCT(playerId) FROM whoscored WHERE season={season} AND
@@ -48,7 +47,7 @@ class PlayerShotDatasource(DataSource):
         return data["playerId"].iloc[0]
 
     def impl_get_data(self, season: int, competition: str, team: str, player: str):
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
         player_id = self._get_player_id(season, competition, team, player)
         gender = "w" if competition in ["WSL"] else "m"
         data = conn.query(
@@ -28,6 +28,7 @@ class RadarDataSource(DataSource):
 
         df1 = DataSource.get_data(
             template_name,
+            connection_provider=self.connection_provider,
             player_id=player_ids[0],
             leagues=leagues,
             team=teams[0],
@@ -38,6 +39,7 @@ class RadarDataSource(DataSource):
         )
         df2 = DataSource.get_data(
             template_name,
+            connection_provider=self.connection_provider,
             player_id=player_ids[1],
             leagues=leagues,
             team=teams[1],
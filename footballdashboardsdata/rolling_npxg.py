@@ -1,146 +1,402 @@
+import numbers
+import numpy as np
 import pandas as pd
 from abc import abstractmethod
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Union
 import datetime as dt
 from footballdashboardsdata.datasource import DataSource
-from footmav import FbRefData, fb, aggregate_by, filter, filters, Filter
-from dbconnect.connector import Connection
 from footballdashboardsdata.utils.queries import (
+    decorate_team_names_from_fb_names,
     get_decorated_team_name_from_fb_name,
     get_decorated_league_name_from_fb_name,
+    get_league_gender,
 )
+from footballdashboardsdata.utils.caching import TTLCache
 
+LEAGUE_BASELINE_TTL = 3600.0
 
 
+class LeagueNPXGBaseline:
+    """
+    League-wide npxG reference for normalizing a team's series: the average team
+    npxG per match, and per team the average npxG created (``avg_for``) and
+    conceded (``avg_against``) per match.
+    """
+
+    def __init__(self, league_avg: float, avg_for: pd.Series, avg_against: pd.Series):
+        self.league_avg = league_avg
+        self.avg_for = avg_for
+        self.avg_against = avg_against
+
+    @classmethod
+    def from_league_data(cls, league_data: pd.DataFrame) -> "LeagueNPXGBaseline":
+        """
+        Build the baseline from team-match (or player-match) rows with date, squad,
+        opponent and npxg, using a single team-match aggregation.
+        """
+        team_matches = (
+            league_data.groupby(["date", "squad", "opponent"], dropna=False)["npxg"]
+            .sum()
+            .reset_index()
+        )
+        return cls(
+            league_avg=team_matches["npxg"].mean(),
+            avg_for=team_matches.groupby("squad")["npxg"].mean(),
+            avg_against=team_matches.groupby("opponent")["npxg"].mean(),
+        )
+
+
+_LEAGUE_BASELINE_CACHE = TTLCache(ttl=LEAGUE_BASELINE_TTL, max_entries=64)
+
+VALUE_COLS = ["npxg", "npxg_opp", "norm_for", "norm_against", "npxg_norm", "npxg_opp_norm"]
+OUTPUT_COLS = [
+    "date",
+    "opponent",
+    "npxg",
+    "npxg_opp",
+    "round",
+    "team",
+    "team_img",
+    "league",
+    "season",
+    "rolling_window",
+    "window_type",
+]
+
+
+def rolling_means(values: np.ndarray, window: int, positions: np.ndarray) -> np.ndarray:
+    """
+    Trailing ``window``-row means of every column of ``values`` from cumulative sums.
+
+    ``positions`` is each row's position within its series (rows of one series are
+    contiguous). Like ``DataFrame.rolling(window).mean()``, a mean is NaN until the
+    series has ``window`` rows and whenever the window contains a NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.vstack([zeros, np.cumsum(np.where(missing, 0.0, values), axis=0)])
+    missing_counts = np.vstack([zeros, np.cumsum(missing, axis=0)])
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    means = (sums[end] - sums[start]) / window
+    incomplete = (np.asarray(positions) < window - 1)[:, None]
+    invalid = incomplete | (missing_counts[end] - missing_counts[start] > 0)
+    means[invalid] = np.nan
+    return means
+
+
+def ewm_means(df: pd.DataFrame, span: int, group_col: str = None) -> np.ndarray:
+    """
+    Exponentially weighted means of ``VALUE_COLS`` in ``df`` row order, computed
+    within each ``group_col`` series.
+    """
+    if group_col is None:
+        return df[VALUE_COLS].ewm(span=span).mean().to_numpy()
+    means = df.groupby(group_col, sort=False)[VALUE_COLS].ewm(span=span).mean()
+    return means.reset_index(level=0, drop=True).loc[df.index].to_numpy()
+
 
 class RollingNPXGDataSourceBase(DataSource):
 
     @abstractmethod
-    def get_raw_data(self, query_params:Dict[str, Any])->Tuple[pd.DataFrame, pd.DataFrame]:
-        pass
+    def get_raw_data(self, query_params:Dict[str, Any])->pd.DataFrame:
+        """
+        Team-match npxg rows (match_id, date, squad, opponent, season, npxg) of the
+        matches ``query_params["team"]`` played in.
+        """
 
+    @abstractmethod
+    def get_league_data(self, query_params:Dict[str, Any])->pd.DataFrame:
+        """
+        Team-match npxg rows (match_id, date, squad, opponent, season, npxg) for the
+        whole league window.
+        """
+
+    def _league_baseline_key(self, query_params:Dict[str, Any]) -> tuple:
+        league_params = tuple(sorted((k, str(v)) for k, v in query_params.items() if k != "team"))
+        return (self.conn, type(self).__name__, league_params)
+
+    def get_league_baseline(self, query_params:Dict[str, Any])->LeagueNPXGBaseline:
+        """
+        Cached per league and season/date window, so every team of a league shares
+        one baseline.
+        """
+        return _LEAGUE_BASELINE_CACHE.get_or_load(
+            self._league_baseline_key(query_params),
+            lambda: LeagueNPXGBaseline.from_league_data(self.get_league_data(query_params)),
+        )
+
+    @staticmethod
+    def _check_required(**params):
+        missing = [name for name, value in params.items() if value is None]
+        if missing:
+            raise TypeError(f"impl_get_data() missing required arguments: {', '.join(missing)}")
+
+    @staticmethod
+    def _check_team(team: str, all_teams: bool):
+        if all_teams and team is not None:
+            raise ValueError("team must not be set when all_teams is True")
+        if not all_teams and team is None:
+            raise ValueError("team is required unless all_teams is True")
+
+    @staticmethod
+    def _normalize(df: pd.DataFrame, baseline: LeagueNPXGBaseline):
+        df["norm_for"] = df["opponent"].map(baseline.avg_against)
+        df["norm_against"] = df["opponent"].map(baseline.avg_for)
+        df["npxg_norm"] = df["npxg"] - df["norm_for"] + baseline.league_avg
+        df["npxg_opp_norm"] = df["npxg_opp"] - df["norm_against"] + baseline.league_avg
+
+    @staticmethod
+    def _rolling_frames(
+        df: pd.DataFrame,
+        rolling_window: Union[int, List[int]],
+        normalized: bool,
+        ewm_spans: List[int] = None,
+        group_col: str = None,
+    ) -> pd.DataFrame:
+        """
+        Rolling (and optionally exponentially weighted) means of the normalized
+        per-match series in ``df``, one block of rows per window, tagged with
+        ``rolling_window`` and ``window_type``. ``df`` must be sorted by date within
+        ``group_col``. Rows without a full window are dropped and ``round`` counts
+        the remaining rows of each series.
+        """
+        if isinstance(rolling_window, numbers.Integral):
+            rolling_window = [rolling_window]
+        group_cols = [group_col] if group_col else []
+        keys = ["date", "opponent"] + group_cols
+        columns = ["date", "opponent", "npxg", "npxg_opp", "round"] + group_cols
+        columns += ["rolling_window", "window_type"]
+        if group_col:
+            positions = df.groupby(group_col, sort=False).cumcount().to_numpy()
+        else:
+            positions = np.arange(len(df))
+        values = df[VALUE_COLS].to_numpy(dtype=float)
+
+        blocks = [("rolling", w, rolling_means(values, w, positions)) for w in rolling_window]
+        for span in ewm_spans or []:
+            blocks.append(("ewm", span, ewm_means(df, span, group_col)))
+
+        frames = []
+        for window_type, window, means in blocks:
+            frame = df[keys].copy()
+            frame[VALUE_COLS] = means
+            frame = frame.dropna(subset=VALUE_COLS)
+            if group_col:
+                frame["round"] = frame.groupby(group_col).cumcount()
+            else:
+                frame["round"] = range(0, len(frame))
+            if normalized:
+                frame = frame.drop(columns=["npxg", "npxg_opp"]).rename(
+                    columns={"npxg_norm": "npxg", "npxg_opp_norm": "npxg_opp"}
+                )
+            frame["rolling_window"] = window
+            frame["window_type"] = window_type
+            frames.append(frame[columns])
+        return pd.concat(frames, ignore_index=True)
+
+    def _impl_get_all_teams_data(
+        self,
+        param_kwargs:Dict[str, Any],
+        league:str,
+        rolling_window: Union[int, List[int]],
+        normalized: bool,
+        ewm_spans: List[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Rolling npxg for and against for every team of the league from the single
+        league-wide query, as one long frame keyed by ``team_img``.
+        """
+        param_kwargs['league'] = league
+        league_data = self.get_league_data(param_kwargs)
+        baseline = LeagueNPXGBaseline.from_league_data(league_data)
+        _LEAGUE_BASELINE_CACHE.put(self._league_baseline_key(param_kwargs), baseline)
+
+        team_matches = (
+            league_data.groupby(["date", "squad", "opponent"], dropna=False)
+            .agg(npxg=("npxg", "sum"))
+            .reset_index()
+        )
+        conceded = team_matches.rename(
+            columns={"squad": "opponent", "opponent": "squad", "npxg": "npxg_opp"}
+        )
+        df = team_matches.merge(conceded, on=["date", "squad", "opponent"])
+        df = df.sort_values(["squad", "date"], kind="stable").reset_index(drop=True)
+
+        self._normalize(df, baseline)
+        data = self._rolling_frames(df, rolling_window, normalized, ewm_spans, group_col="squad")
+        data = data.rename(columns={"squad": "team_img"})
+        seasons = league_data.groupby("squad")["season"].agg(
+            lambda x: ', '.join([str(s) for s in x.unique()])
+        )
+        data["team"] = decorate_team_names_from_fb_names(
+            data["team_img"], get_league_gender(league, self.conn), self.conn
+        )
+        data["league"] = get_decorated_league_name_from_fb_name(league, self.conn)
+        data["season"] = data["team_img"].map(seasons)
+        data = data[OUTPUT_COLS]
+        data["normalized"] = normalized
+        return data
 
     def _impl_get_data(
-        self,param_kwargs:Dict[str, Any], league:str, team:str, rolling_window: int, normalized: bool
+        self,
+        param_kwargs:Dict[str, Any],
+        league:str,
+        team:str,
+        rolling_window: Union[int, List[int]],
+        normalized: bool,
+        ewm_spans: List[int] = None,
     ) -> pd.DataFrame:
         """
-        Joins team and opponent nxpg data and computes rolling averages on each
+        Joins team and opponent nxpg data and computes rolling averages on each.
+        ``rolling_window`` may be a list of windows and ``ewm_spans`` adds
+        exponentially weighted means; every window comes back as its own block of
+        rows, told apart by ``rolling_window`` and ``window_type``.
         """
         param_kwargs['league'] = league
         param_kwargs['team'] = team
-        raw_data, avg_data  = self.get_raw_data(param_kwargs)
-        data = FbRefData(raw_data)
-        team_data = data.pipe(filter, [Filter(fb.TEAM, team, filters.EQ)]).pipe(
-            aggregate_by, [fb.DATE]
+        raw_data = self.get_raw_data(param_kwargs)
+        baseline = self.get_league_baseline(param_kwargs)
+        team_data = (
+            raw_data.loc[raw_data["squad"] == team]
+            .groupby("date", as_index=False)
+            .agg(opponent=("opponent", "first"), npxg=("npxg", "sum"))
         )
-        opp_data = data.pipe(filter, [Filter(fb.OPPONENT, team, filters.EQ)]).pipe(
-            aggregate_by, [fb.DATE]
+        opp_data = (
+            raw_data.loc[raw_data["opponent"] == team]
+            .groupby("date", as_index=False)
+            .agg(opponent=("opponent", "first"), npxg=("npxg", "sum"))
         )
         df = pd.merge(
-            left=team_data.df, right=opp_data.df, on=[fb.DATE.N], suffixes=("", "_opp")
-        )[[fb.DATE.N, fb.OPPONENT.N, fb.NPXG.N, fb.NPXG.N + "_opp"]]
-        
-        league_avg = (
-            avg_data.groupby(["date", "squad"])
-            .agg({"npxg": "sum"})
-            .groupby("squad")
-            .agg({"npxg": ["sum", "count"]})
-            .sum()
-            .values[0]
-            / avg_data.groupby(["date", "squad"])
-            .agg({"npxg": "sum"})
-            .groupby("squad")
-            .agg({"npxg": ["sum", "count"]})
-            .sum()
-            .values[1]
-        )
-        avg_for = (
-            avg_data.groupby(["squad", "date"])
-            .agg({"npxg": "sum"})
-            .groupby("squad")
-            .agg({"npxg": "mean"})
-            .to_dict()["npxg"]
-        )
-        avg_against = (
-            avg_data.groupby(["opponent", "date"])
-            .agg({"npxg": "sum"})
-            .groupby("opponent")
-            .agg({"npxg": "mean"})
-            .to_dict()["npxg"]
-        )
-        df["norm_for"] = df["opponent"].map(avg_against)
-        df["norm_against"] = df["opponent"].map(avg_for)
-        df["npxg_norm"] = df["npxg"] - df["norm_for"] + league_avg
-        df["npxg_opp_norm"] = df["npxg_opp"] - df["norm_against"] + league_avg
-        npxg_for_against_rolling = (
-            df.set_index([fb.DATE.N, fb.OPPONENT.N])
-            .rolling(window=rolling_window)
-            .mean()
-            .reset_index()
-            .dropna()
-        )
-        npxg_for_against_rolling["round"] = range(0, len(npxg_for_against_rolling))
-        if normalized:
-            npxg_for_against_rolling = npxg_for_against_rolling[
-                [fb.DATE.N, fb.OPPONENT.N, "npxg_norm", "npxg_opp_norm", "round"]
-            ].rename(columns={"npxg_norm": "npxg", "npxg_opp_norm": "npxg_opp"})
+            left=team_data, right=opp_data, on=["date"], suffixes=("", "_opp")
+        )[["date", "opponent", "npxg", "npxg_opp"]]
 
-        data = npxg_for_against_rolling[
-            [fb.DATE.N, fb.OPPONENT.N, "npxg", "npxg_opp", "round"]
-        ]
+        self._normalize(df, baseline)
+        data = self._rolling_frames(df, rolling_window, normalized, ewm_spans)
         seasons = ', '.join([str(s) for s in raw_data['season'].unique()])
-        data["team"] = get_decorated_team_name_from_fb_name(team, league)
+        data["team"] = get_decorated_team_name_from_fb_name(team, league, self.conn)
         data["team_img"] = team
-        data["league"] = get_decorated_league_name_from_fb_name(league)
+        data["league"] = get_decorated_league_name_from_fb_name(league, self.conn)
         data["season"] = seasons
-        data["rolling_window"] = rolling_window
+        data = data[OUTPUT_COLS]
         data["normalized"] = normalized
         return data
 
 
 class RollingNPXGBySeasonDataSource(RollingNPXGDataSourceBase):
     def impl_get_data(
-        self, team: str, league: str, season: int, rolling_window: int, normalized: bool
+        self,
+        team: str = None,
+        league: str = None,
+        season: int = None,
+        rolling_window: Union[int, List[int]] = None,
+        normalized: bool = None,
+        *,
+        all_teams: bool = False,
+        ewm_spans: List[int] = None,
     ) -> pd.DataFrame:
+        """
+        ``team`` is required unless ``all_teams=True``, in which case it must be left
+        unset and every team of the league is returned, keyed by ``team_img``. The
+        other positional arguments are always required; they only default so that
+        ``team`` can keep its place in front of them.
+        ``rolling_window`` may be a list of windows and ``ewm_spans`` adds
+        exponentially weighted means.
+        """
         kwargs = {
             "season": season,
             
         }
-        return self._impl_get_data(kwargs, league, team, rolling_window=rolling_window, normalized=normalized)
+        self._check_required(
+            league=league, season=season, rolling_window=rolling_window, normalized=normalized
+        )
+        self._check_team(team, all_teams)
+        if all_teams:
+            return self._impl_get_all_teams_data(
+                kwargs, league, rolling_window=rolling_window, normalized=normalized,
+                ewm_spans=ewm_spans,
+            )
+        return self._impl_get_data(
+            kwargs, league, team, rolling_window=rolling_window, normalized=normalized,
+            ewm_spans=ewm_spans,
+        )
 
-    def get_raw_data(self, query_params:Dict[str, Any])->Tuple[pd.DataFrame, pd.DataFrame]:
-        conn = Connection("M0neyMa$e")
+    def get_raw_data(self, query_params:Dict[str, Any])->pd.DataFrame:
+        conn = self.conn
         season = query_params["season"]
         league = query_params["league"]
         team = query_params["team"]
 
         raw_data = conn.query(
             f"""
-        SELECT * FROM fbref WHERE season={season}
+        SELECT match_id, date, squad, opponent, season, COALESCE(SUM(npxg), 0) AS npxg
+        FROM fbref WHERE season={season}
         AND comp='{league}'
         AND (squad='{team}' OR opponent='{team}')
+        GROUP BY match_id, date, squad, opponent, season
         """
         )
-        avg_data = conn.query(
-            f"""SELECT squad, opponent, player, date, match_id, npxg, home FROM fbref WHERE season={season} and comp='{league}'"""
+        return raw_data
+
+    def get_league_data(self, query_params:Dict[str, Any])->pd.DataFrame:
+        season = query_params["season"]
+        league = query_params["league"]
+        return self.conn.query(
+            f"""SELECT match_id, date, squad, opponent, season, COALESCE(SUM(npxg), 0) AS npxg
+            FROM fbref
+            WHERE season={season} and comp='{league}'
+            GROUP BY match_id, date, squad, opponent, season"""
         )
-        return raw_data, avg_data
     @classmethod
     def get_name(cls) -> str:
         return "rolling_npxg"
 
 class RollingNPXGByDateDataSource(RollingNPXGDataSourceBase):
     def impl_get_data(
-        self, team: str, league: str,  start_date: dt.datetime, end_date: dt.datetime, rolling_window: int, normalized: bool
+        self,
+        team: str = None,
+        league: str = None,
+        start_date: dt.datetime = None,
+        end_date: dt.datetime = None,
+        rolling_window: Union[int, List[int]] = None,
+        normalized: bool = None,
+        *,
+        all_teams: bool = False,
+        ewm_spans: List[int] = None,
     ) -> pd.DataFrame:
+        """
+        ``team`` is required unless ``all_teams=True``, in which case it must be left
+        unset and every team of the league is returned, keyed by ``team_img``. The
+        other positional arguments are always required; they only default so that
+        ``team`` can keep its place in front of them.
+        ``rolling_window`` may be a list of windows and ``ewm_spans`` adds
+        exponentially weighted means.
+        """
         kwargs = {
             "start_date": start_date,
             "end_date": end_date
         }
-        return self._impl_get_data(kwargs, league, team, rolling_window=rolling_window, normalized=normalized)
+        self._check_required(
+            league=league,
+            start_date=start_date,
+            end_date=end_date,
+            rolling_window=rolling_window,
+            normalized=normalized,
+        )
+        self._check_team(team, all_teams)
+        if all_teams:
+            return self._impl_get_all_teams_data(
+                kwargs, league, rolling_window=rolling_window, normalized=normalized,
+                ewm_spans=ewm_spans,
+            )
+        return self._impl_get_data(
+            kwargs, league, team, rolling_window=rolling_window, normalized=normalized,
+            ewm_spans=ewm_spans,
+        )
     
-    def get_raw_data(self, query_params:Dict[str, Any])->Tuple[pd.DataFrame, pd.DataFrame]:
-        conn = Connection("M0neyMa$e")
+    def get_raw_data(self, query_params:Dict[str, Any])->pd.DataFrame:
+        conn = self.conn
         league = query_params["league"]
         team = query_params["team"]
         start_date = query_params["start_date"]
@@ -148,18 +404,27 @@ class RollingNPXGByDateDataSource(RollingNPXGDataSourceBase):
 
         raw_data = conn.query(
             f"""
-        SELECT * FROM fbref WHERE comp='{league}'
+        SELECT match_id, date, squad, opponent, season, COALESCE(SUM(npxg), 0) AS npxg
+        FROM fbref WHERE comp='{league}'
         AND (squad='{team}' OR opponent='{team}')
         AND date BETWEEN '{start_date}' AND '{end_date}'
+        GROUP BY match_id, date, squad, opponent, season
         """
         )
+        return raw_data
 
-        avg_data = conn.query(
+    def get_league_data(self, query_params:Dict[str, Any])->pd.DataFrame:
+        league = query_params["league"]
+        start_date = query_params["start_date"]
+        end_date = query_params["end_date"]
+        return self.conn.query(
             f"""
-            SELECT squad, opponent, date, match_id, npxg, home FROM fbref WHERE comp='{league}' AND date BETWEEN '{start_date}' AND '{end_date}'
+            SELECT match_id, date, squad, opponent, season, COALESCE(SUM(npxg), 0) AS npxg
+            FROM fbref
+            WHERE comp='{league}' AND date BETWEEN '{start_date}' AND '{end_date}'
+            GROUP BY match_id, date, squad, opponent, season
             """
         )
-        return raw_data, avg_data
     
     @classmethod
     def get_name(cls) -> str:
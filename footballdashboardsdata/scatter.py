@@ -1,10 +1,13 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 from footballdashboardsdata.datasource import DataSource
-from dbconnect.connector import Connection
+from footballdashboardsdata.utils.caching import FrameCache
+from footballdashboardsdata.utils.player_season_store import get_player_season_store
+import numpy as np
 import pandas as pd
 import datetime as dt
-from sklearn.preprocessing import MinMaxScaler
+import re
 import json
+import warnings
 
 
 COMPUTED_STATS = [
@@ -49,6 +52,116 @@ COMPUTED_STATS = [
 ]
 
 
+SUM_RE = re.compile(r"SUM\((\w+)\)")
+
+_PLAYER_AGGREGATE_CACHE = FrameCache(max_bytes=512 * 1024 * 1024, max_entries=32)
+
+
+def default_label(stat: str) -> str:
+    return stat.replace("_", " ").title()
+
+
+def summed_stat(stat: str, label: str, per_90: bool = True) -> dict:
+    return {
+        "label": label,
+        "expression": f"SUM({stat})",
+        "formula": None,
+        "columns": [stat],
+        "per_90": per_90,
+        "dtype": "float",
+        "source": stat,
+    }
+
+
+def build_stat_catalog(
+    labels: Dict[str, str],
+    categorical_stats: List[str],
+    categorical_sources: Dict[str, str],
+) -> dict:
+    """
+    Stat name -> definition: label, SQL ``expression`` and the pandas ``formula``
+    evaluated on summed columns, the fbref ``columns`` it reads, whether it is
+    normalized per 90, ``dtype`` and the ``source`` column for stats read as is.
+    Stats missing from the catalog are plain summed fbref columns.
+    """
+    catalog = {stat: summed_stat(stat, label) for stat, label in labels.items()}
+    catalog["minutes"] = summed_stat("minutes", "Minutes", per_90=False)
+    for stat in categorical_stats:
+        catalog[stat] = {
+            "label": labels.get(stat, default_label(stat)),
+            "expression": None,
+            "formula": None,
+            "columns": [],
+            "per_90": False,
+            "dtype": "category",
+            "source": categorical_sources.get(stat, stat),
+        }
+    for stat, label, expression, per_90 in COMPUTED_STATS:
+        catalog[stat] = {
+            "label": label,
+            "expression": expression,
+            "formula": SUM_RE.sub(r"\1", expression),
+            "columns": list(dict.fromkeys(SUM_RE.findall(expression))),
+            "per_90": per_90,
+            "dtype": "float",
+            "source": None,
+        }
+    return catalog
+
+
+def min_max_scale(values: np.ndarray) -> np.ndarray:
+    """
+    Scale each column to [0, 1] like sklearn's ``MinMaxScaler``: NaNs are ignored
+    when fitting and kept, constant columns scale to 0.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.shape[0] == 0:
+        return values
+    with warnings.catch_warnings():
+        # all-NaN columns stay NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low = np.nanmin(values, axis=0)
+        value_range = np.nanmax(values, axis=0) - low
+    value_range[value_range == 0] = 1.0
+    return (values - low) / value_range
+
+
+def grid_downsample(
+    scaled: np.ndarray, priority: np.ndarray, keep: np.ndarray, max_points: int
+) -> np.ndarray:
+    """
+    Boolean mask of the points to send: every ``keep`` point, plus the others
+    thinned on a grid over the scaled coordinates until ``max_points`` is reached.
+
+    The remaining budget is dealt out across grid cells round-robin, highest
+    ``priority`` first within a cell, so sparse regions and outliers keep their
+    points while dense clusters are thinned.
+    """
+    mask = keep.copy()
+    candidates = np.flatnonzero(~keep)
+    budget = max_points - int(keep.sum())
+    if budget >= len(candidates):
+        mask[candidates] = True
+        return mask
+    if budget <= 0:
+        return mask
+    cells_per_axis = int(np.ceil(np.sqrt(budget)))
+    cell_xy = np.clip(
+        np.nan_to_num(scaled[candidates] * cells_per_axis).astype(int),
+        0,
+        cells_per_axis - 1,
+    )
+    cell = cell_xy[:, 0] * cells_per_axis + cell_xy[:, 1]
+    by_cell = np.lexsort((-np.nan_to_num(priority[candidates]), cell))
+    sorted_cell = cell[by_cell]
+    cell_start = np.flatnonzero(np.r_[True, sorted_cell[1:] != sorted_cell[:-1]])
+    cell_sizes = np.diff(np.r_[cell_start, len(by_cell)])
+    rank = np.arange(len(by_cell)) - np.repeat(cell_start, cell_sizes)
+    chosen = by_cell[np.lexsort((sorted_cell, rank))[:budget]]
+    mask[candidates[chosen]] = True
+    return mask
+
+
 def add_years(original_date, years):
     try:
         # Calculate the target year
@@ -158,141 +271,142 @@ class ScatterDataSource(DataSource):
 
     MOST_COMMON_AGG_COLS = ["enriched_position"]
     CATEGORICAL_COLS = ["comp", "team"]
+    CATEGORICAL_COL_SOURCES = {"team": "squad"}
     POSITION_COLS = ["enriched_position"]
+    PLAYER_KEY_COLS = ["player_id", "player", "comp", "squad", "season"]
+    AGGREGATE_KEY_COLS = PLAYER_KEY_COLS + ["enriched_position", "dob"]
+    STAT_CATALOG = build_stat_catalog(
+        COL_RENAME_DICT, CATEGORICAL_COLS + MOST_COMMON_AGG_COLS, CATEGORICAL_COL_SOURCES
+    )
 
     @classmethod
     def get_name(cls):
         return "ScatterDataSource"
 
+    def _stat(self, stat: str) -> dict:
+        definition = self.STAT_CATALOG.get(stat)
+        if definition is None:
+            return summed_stat(stat, default_label(stat))
+        return definition
+
     def _format_label(self, label: str, normalize_per_90) -> str:
-        try:
-            label_n = next(t[1] for t in COMPUTED_STATS if t[0] == label)
-        except:
-            if label in self.COL_RENAME_DICT:
-                label_n = self.COL_RENAME_DICT[label]
-            else:
-                label_n = label.replace("_", " ").title()
-        if (
-            normalize_per_90
-            and label != "minutes"
-            and label not in self.CATEGORICAL_COLS
-            and label not in self.MOST_COMMON_AGG_COLS
-            and label not in [v[0] for v in COMPUTED_STATS if v[3] == False]
-        ):
-            label_n += " P90"
-        return label_n
-
-    def _construct_player_query_string(
-        self,
-        leagues: List[str],
-        season: int,
-        teams: List[str],
-        x_axis: str,
-        y_axis: str,
-        size_axis: str,
-        color_axis: str,
-        position_filter: List[str],
-        dob_values_filter: Tuple[int, int],
-    ) -> str:
-        try:
-            x_axis = next(t[2] for t in COMPUTED_STATS if t[0] == x_axis)
-        except:
-            x_axis = f"SUM({x_axis})"
-        try:
-            y_axis = next(t[2] for t in COMPUTED_STATS if t[0] == y_axis)
-        except:
-            y_axis = f"SUM({y_axis})"
+        definition = self._stat(label)
+        if normalize_per_90 and definition["per_90"]:
+            return definition["label"] + " P90"
+        return definition["label"]
 
+    def _query_player_aggregates(
+        self, columns: List[str], leagues: List[str], season: int
+    ) -> pd.DataFrame:
+        value_columns = [
+            c
+            for c in columns
+            if c not in self.AGGREGATE_KEY_COLS and c not in ["row_count", "minutes"]
+        ]
         league_string = ", ".join([f"'{league}'" for league in leagues])
+        sums = "".join([f", SUM({c}) AS {c}" for c in value_columns])
+        keys = ", ".join(self.AGGREGATE_KEY_COLS)
         query_string = f"""
-        SELECT player_id, player, comp, squad,season,
-        SUM(minutes) AS minutes,
-        {x_axis} AS x_axis,
-        {y_axis} AS y_axis
-        """
-        if size_axis:
-            size_axis = next(
-                (t[2] for t in COMPUTED_STATS if t[0] == size_axis),
-                f"SUM({size_axis})",
-            )
-            query_string += f",{size_axis} AS size_axis"
-        if color_axis:
-            if color_axis not in self.MOST_COMMON_AGG_COLS:
-                if color_axis in self.CATEGORICAL_COLS:
-                    query_string += f",{color_axis} AS color_axis"
-                else:
-
-                    color_axis = next(
-                        (t[2] for t in COMPUTED_STATS if t[0] == color_axis),
-                        f"SUM({color_axis})",
-                    )
-                    query_string += f",{color_axis} AS color_axis"
-        query_string += f"""
-        FROM fbref AS t1
+        SELECT {keys}, COUNT(*) AS row_count, SUM(minutes) AS minutes{sums}
+        FROM fbref
         WHERE season = {season}
-        AND dob BETWEEN '{dob_values_filter[0]}' AND '{dob_values_filter[1]}'
         AND comp IN ({league_string})
+        GROUP BY {keys}
         """
+        data = self.conn.query(query_string)
+        for c in ["row_count", "minutes"] + value_columns:
+            data[c] = data[c].astype(float)
+        return data
+
+    def _get_player_aggregates(
+        self, leagues: List[str], season: int, stat_columns: List[str]
+    ) -> pd.DataFrame:
+        """
+        fbref summed per (player, team, league, season, position, dob) in one grouped
+        scan, cached per league-season. Stats requested later are added to the cached
+        frame on the next miss, so flipping between axes is answered from memory.
+        """
+        columns = list(
+            dict.fromkeys(self.AGGREGATE_KEY_COLS + ["row_count", "minutes"] + stat_columns)
+        )
+        stored = self._read_player_season_store(columns, leagues, season)
+        if stored is not None:
+            return stored
+        return _PLAYER_AGGREGATE_CACHE.get_or_load(
+            ("scatter", self.conn, tuple(sorted(leagues)), season),
+            lambda cols: self._query_player_aggregates(cols, leagues, season),
+            columns=columns,
+        )
+
+    def _read_player_season_store(
+        self, columns: List[str], leagues: List[str], season: int
+    ) -> pd.DataFrame:
+        """
+        The aggregates from the materialized player-season store, or None when no
+        store is configured or it lacks the leagues or columns.
+        """
+        store = get_player_season_store()
+        if store is None or not store.covers(leagues, season):
+            return None
+        if any(not set(columns) <= set(store.columns(league, season)) for league in leagues):
+            return None
+        value_columns = [c for c in columns if c not in self.AGGREGATE_KEY_COLS]
+        data = store.read(leagues, season, columns)
+        # the store also splits by gender, which scatter does not key on; like SQL
+        # SUM, a stat that is NULL on every row stays NULL
+        data = data.groupby(self.AGGREGATE_KEY_COLS, sort=False, dropna=False, as_index=False)[
+            value_columns
+        ].sum(min_count=1)
+        data[value_columns] = data[value_columns].astype(float)
+        return data
+
+    def _player_totals(
+        self,
+        aggregates: pd.DataFrame,
+        teams: List[str],
+        position_filter: List[str],
+        dob_values_filter: Tuple[str, str],
+    ) -> pd.DataFrame:
+        """
+        Filter the per-position aggregates and total them per player-team, with the
+        most common position over the remaining matches.
+        """
+        dob = pd.to_datetime(aggregates["dob"], errors="coerce")
+        mask = (dob >= pd.Timestamp(dob_values_filter[0])) & (
+            dob <= pd.Timestamp(dob_values_filter[1])
+        )
         if position_filter:
-            position_string = ", ".join(
-                [f"'{position}'" for position in position_filter]
-            )
-            query_string += f"AND enriched_position IN ({position_string})"
+            mask &= aggregates["enriched_position"].isin(position_filter)
         if teams:
-            team_string = ", ".join([f"'{team}'" for team in teams])
-            query_string += f"AND squad IN ({team_string})"
-        query_string += """
-        GROUP BY player_id, player, comp, squad
-        """
+            mask &= aggregates["squad"].isin(teams)
+        aggregates = aggregates.loc[mask]
 
-        if color_axis and color_axis in self.MOST_COMMON_AGG_COLS:
-            orig_query_string = query_string
-            query_string = f"""
-                SELECT T1.player_id, T1.season, T1.player, T1.comp, T1.squad, T1.minutes, T1.x_axis, T1.y_axis, 
-            """
-            if size_axis:
-                query_string += f"T1.size_axis, "
-            query_string += f"""T2.{color_axis} AS color_axis
-                FROM ({orig_query_string}) AS T1
-                JOIN (
-                    WITH RankedCatgroups AS (
-                        SELECT 
-                            player_id,
-                            player,
-                            squad,
-                            comp,
-                    
-                            {color_axis},
-                            ROW_NUMBER() OVER (PARTITION BY player_id, player,squad, comp ORDER BY COUNT(*) DESC) AS rn
-                        FROM fbref
-                        WHERE season={season}
-                        AND dob BETWEEN '{dob_values_filter[0]}' AND '{dob_values_filter[1]}'
-                        AND comp in ({league_string})
-                """
-            if teams:
-                query_string += f"AND squad IN ({team_string})"
-            if position_filter:
-                query_string += f"AND enriched_position IN ({position_string})"
-
-            query_string += f"""
-                    GROUP BY player_id, player, squad, comp, {color_axis}
-                )
-                SELECT 
-                    player_id,
-                    player,
-                    squad,
-                    comp,
-                    {color_axis}
-                FROM RankedCatgroups
-                WHERE rn = 1
-                )  T2
-                ON T1.player_id = T2.player_id
-                AND T1.player = T2.player
-                AND T1.squad = T2.squad
-                AND T1.comp = T2.comp
-            """
-        print(query_string)
-        return query_string
+        value_columns = [c for c in aggregates.columns if c not in self.AGGREGATE_KEY_COLS]
+        # like SQL SUM, a stat that is NULL on every row stays NULL rather than 0
+        totals = aggregates.groupby(self.PLAYER_KEY_COLS, sort=False, dropna=False)[
+            value_columns
+        ].sum(min_count=1)
+        modal_position = (
+            aggregates.groupby(self.PLAYER_KEY_COLS + ["enriched_position"], sort=False, dropna=False)[
+                "row_count"
+            ]
+            .sum()
+            .reset_index()
+            .sort_values("row_count", ascending=False, kind="stable")
+            .drop_duplicates(self.PLAYER_KEY_COLS)
+            .set_index(self.PLAYER_KEY_COLS)["enriched_position"]
+        )
+        totals["enriched_position"] = modal_position.reindex(totals.index)
+        return totals.reset_index()
+
+    def _evaluate_stat(self, totals: pd.DataFrame, stat: str) -> pd.Series:
+        definition = self._stat(stat)
+        if definition["formula"] is None:
+            return totals[definition["source"]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = totals.eval(definition["formula"], engine="python")
+        # SQL returns NULL on division by zero
+        return values.replace([np.inf, -np.inf], np.nan)
 
     def impl_get_data(
         self,
@@ -311,7 +425,16 @@ class ScatterDataSource(DataSource):
         normalize_per_90: bool = True,
         age_filter: Tuple[int, int] = None,
         value_highlights: Tuple[Tuple[float, float], Tuple[float, float]] = None,
+        max_points: int = None,
     ):
+        """
+        Scatter points for the chosen axes.
+
+        With ``max_points`` set, annotated points (highlighted players or teams
+        and value outliers) are always returned and the rest are thinned on a
+        grid so that at most ``max_points`` rows are returned in total, unless
+        the annotated points alone exceed it.
+        """
         _position_filter = position_filter.copy() or []
         if "LB" in _position_filter:
             _position_filter.append("LWB")
@@ -353,7 +476,7 @@ class ScatterDataSource(DataSource):
         else:
             data["annotate"] = data["squad"].apply(lambda x: x in item_highlights)
 
-        value_scaler = MinMaxScaler().fit_transform(data[["x_axis", "y_axis"]])
+        value_scaler = min_max_scale(data[["x_axis", "y_axis"]].to_numpy())
         data["annotate"] = data["annotate"] | (
             (value_scaler[:, 0] < value_highlights[0][0])
             | (value_scaler[:, 0] > value_highlights[0][1])
@@ -373,17 +496,27 @@ class ScatterDataSource(DataSource):
                 lambda x: {"LWB": "LB", "RWB": "RB", "LM": "LW", "RM": "RW"}.get(x, x)
             )
         data = data.dropna()
-        data["filter_data"] = json.dumps(
-            {
-                "leagues": leagues,
-                "season": season,
-                "teams": teams,
-                "position_filter": position_filter,
-                "minutes_filter": minutes_filter,
-                "normalize_per_90": normalize_per_90,
-                "age_filter": age_filter,
-            }
-        )
+        if max_points is not None and len(data) > max_points:
+            data = data.loc[
+                grid_downsample(
+                    min_max_scale(data[["x_axis", "y_axis"]].to_numpy()),
+                    data["minutes"].to_numpy(dtype=float),
+                    data["annotate"].to_numpy(dtype=bool),
+                    max_points,
+                )
+            ]
+        filter_data = {
+            "leagues": leagues,
+            "season": season,
+            "teams": teams,
+            "position_filter": position_filter,
+            "minutes_filter": minutes_filter,
+            "normalize_per_90": normalize_per_90,
+            "age_filter": age_filter,
+        }
+        if max_points is not None:
+            filter_data["max_points"] = max_points
+        data["filter_data"] = json.dumps(filter_data)
         return data
 
     def _fix_types(self, data: pd.DataFrame, color_axis: str) -> pd.DataFrame:
@@ -392,10 +525,7 @@ class ScatterDataSource(DataSource):
         data["minutes"] = data["minutes"].astype(float)
         if "size_axis" in data.columns:
             data["size_axis"] = data["size_axis"].astype(float)
-        if "color_axis" in data.columns and (
-            color_axis not in self.CATEGORICAL_COLS
-            and color_axis not in self.MOST_COMMON_AGG_COLS
-        ):
+        if "color_axis" in data.columns and self._stat(color_axis)["dtype"] == "float":
             data["color_axis"] = data["color_axis"].astype(float)
         return data
 
@@ -414,45 +544,21 @@ class ScatterDataSource(DataSource):
         dob_values_filter: Tuple[int, int],
     ) -> pd.DataFrame:
 
-        query_string = self._construct_player_query_string(
-            leagues=leagues,
-            season=season,
-            teams=teams,
-            x_axis=x_axis,
-            y_axis=y_axis,
-            size_axis=size_axis,
-            color_axis=color_axis,
-            position_filter=position_filter,
-            dob_values_filter=dob_values_filter,
-        )
-        raw_data = Connection("M0neyMa$e").query(query_string)
-        # raw_data = self._fix_types(raw_data, color_axis)
+        axes = {"x_axis": x_axis, "y_axis": y_axis}
+        if size_axis:
+            axes["size_axis"] = size_axis
+        if color_axis:
+            axes["color_axis"] = color_axis
+        stat_columns = [c for stat in axes.values() for c in self._stat(stat)["columns"]]
+        aggregates = self._get_player_aggregates(leagues, season, stat_columns)
+        totals = self._player_totals(aggregates, teams, position_filter, dob_values_filter)
+
+        raw_data = totals[self.PLAYER_KEY_COLS + ["minutes"]].copy()
+        for axis, stat in axes.items():
+            raw_data[axis] = self._evaluate_stat(totals, stat)
         raw_data = raw_data[raw_data["minutes"] > minutes_filter]
 
         if normalize_per_90:
-            if x_axis != "minutes" and x_axis not in [
-                v[0] for v in COMPUTED_STATS if v[3] == False
-            ]:
-                raw_data["x_axis"] = raw_data["x_axis"] / raw_data["minutes"] * 90
-            if y_axis != "minutes" and y_axis not in [
-                v[0] for v in COMPUTED_STATS if v[3] == False
-            ]:
-                raw_data["y_axis"] = raw_data["y_axis"] / raw_data["minutes"] * 90
-            if size_axis and size_axis != "minutes" and size_axis not in [
-                v[0] for v in COMPUTED_STATS if v[3] == False
-            ]:
-                raw_data["size_axis"] = raw_data["size_axis"] / raw_data["minutes"] * 90
-            if (
-                color_axis
-                and color_axis != "minutes"
-                and (
-                    color_axis not in self.CATEGORICAL_COLS
-                    and color_axis not in self.MOST_COMMON_AGG_COLS
-                    and color_axis
-                    not in [v[0] for v in COMPUTED_STATS if v[3] == False]
-                )
-            ):
-                raw_data["color_axis"] = (
-                    raw_data["color_axis"] / raw_data["minutes"] * 90
-                )
+            per_90_axes = [axis for axis, stat in axes.items() if self._stat(stat)["per_90"]]
+            raw_data[per_90_axes] = raw_data[per_90_axes].div(raw_data["minutes"], axis=0) * 90
         return raw_data
@@ -1,5 +1,4 @@
 from footballdashboardsdata.datasource import DataSource
-from dbconnect.connector import Connection
 from footmav.utils import whoscored_funcs as WF
 from footmav.data_definitions.whoscored.constants import EventType
 
@@ -10,7 +9,7 @@ class ShotDataSource(DataSource):
         return "ShotData"
 
     def impl_get_data(self, match_id: str):
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
         query = f"""
             SELECT fbref_shots.*, 
             T1.decorated_name as squad_decorated_name,
@@ -58,7 +57,7 @@ class ShotDataSourceEvents(DataSource):
         return "ShotDataEvents"
 
     def impl_get_data(self, match_id: str):
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
         query = f"""
             SELECT * FROM football_data.whoscored T1
             INNER JOIN derived.whoscored_shot_data T2
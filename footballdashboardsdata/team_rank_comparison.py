@@ -1,7 +1,6 @@
 from typing import List, Tuple
 import pandas as pd
 from footballdashboardsdata.datasource import DataSource
-from dbconnect.connector import Connection
 
 METRICS = [
     ("performance", True, "Performance"),
@@ -132,7 +131,7 @@ class TeamRankDataSource(DataSource):
     def impl_get_data(
         self, team_choices: List[Tuple[str, int, int]], select_similar_leagues: bool
     ) -> pd.DataFrame:
-        conn = Connection("M0neyMa$e")
+        conn = self.conn
         competitions = [c[0] for c in team_choices]
         # find complimentary competitions in LEAGUE_GROUPS
         if select_similar_leagues:
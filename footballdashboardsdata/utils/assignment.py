@@ -0,0 +1,38 @@
+from typing import List, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def max_weight_assignment(
+    weights: np.ndarray, eligible: np.ndarray
+) -> List[Tuple[int, int]]:
+    """
+    Assign rows (players) to columns (slots) so that each slot gets at most one
+    eligible row, each row at most one slot, as many slots as possible are filled
+    and, among those, the total weight is maximal.
+
+    Args:
+        weights (np.ndarray): (rows,) weight of each row, or (rows, slots) per slot
+        eligible (np.ndarray): (rows, slots) boolean eligibility mask
+
+    Returns:
+        List[Tuple[int, int]]: (row, slot) pairs sorted by slot; unfillable slots
+        are missing
+    """
+    eligible = np.asarray(eligible, dtype=bool)
+    n_rows, n_slots = eligible.shape
+    if n_rows == 0 or n_slots == 0:
+        return []
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim == 1:
+        weights = np.repeat(weights[:, None], n_slots, axis=1)
+    weights = np.nan_to_num(weights, nan=0.0)
+
+    # an ineligible pairing costs more than any feasible swap can gain, so the solver
+    # only uses one when a slot has no eligible row left
+    penalty = 2.0 * (np.abs(weights).max() + 1.0) * (n_slots + 1)
+    cost = np.where(eligible, -weights, penalty)
+    rows, slots = linear_sum_assignment(cost)
+    pairs = [(r, s) for r, s in zip(rows, slots) if eligible[r, s]]
+    return sorted(pairs, key=lambda p: p[1])
@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import pandas as pd
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire ``ttl`` seconds after loading.
+
+    ``ttl=None`` keeps entries until they are evicted or invalidated. Loaders run
+    outside the cache lock; concurrent misses on one key share a single load.
+    """
+
+    def __init__(self, ttl: Optional[float] = 3600.0, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading: Dict[Hashable, Future] = {}
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    def _expired(self, loaded_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - loaded_at > self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[1]):
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._entries.move_to_end(key)
+                return entry[0]
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = Future()
+                generation = self._generation
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result()
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(key, None)
+            # a load that raced an invalidation is returned but not kept
+            if generation == self._generation:
+                self.put(key, value)
+        pending.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable = None):
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FrameCache:
+    """
+    LRU cache of DataFrames bounded by entry count and memory footprint.
+
+    Each entry remembers the columns it was loaded with. A request for a subset of
+    those columns is served as a projected copy; a request for columns that are
+    missing reloads the entry with the union, so the cached frame converges on the
+    column superset its callers need. ``columns=None`` means "every column".
+
+    Loaders run outside the cache lock. Concurrent misses on one key wait for the
+    load in flight and reuse it when it covers their columns.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 512 * 1024 * 1024,
+        max_entries: int = 16,
+        ttl: Optional[float] = 3600.0,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._nbytes = 0
+        self._loading: Dict[Hashable, Future] = {}
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def _expired(self, loaded_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - loaded_at > self.ttl
+
+    @staticmethod
+    def _covers(cached: Optional[frozenset], columns: Optional[List[str]]) -> bool:
+        if cached is None:
+            return True
+        return columns is not None and cached.issuperset(columns)
+
+    @staticmethod
+    def _project(frame: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+        if columns is None:
+            return frame.copy()
+        return frame[list(dict.fromkeys(columns))].copy()
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._nbytes > self.max_bytes
+        ):
+            _, (_, _, _, nbytes) = self._entries.popitem(last=False)
+            self._nbytes -= nbytes
+
+    def _store(self, key: Hashable, frame: pd.DataFrame, columns: Optional[frozenset]):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._nbytes -= old[3]
+        nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+        self._entries[key] = (frame, columns, time.monotonic(), nbytes)
+        self._nbytes += nbytes
+        self._evict()
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[Optional[List[str]]], pd.DataFrame],
+        columns: Optional[List[str]] = None,
+        load_columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Return a copy of the cached frame for ``key`` restricted to ``columns``.
+
+        On a miss ``loader`` is called with the columns to fetch: ``columns`` plus
+        ``load_columns`` (a wider set worth fetching up front) plus whatever the
+        previous entry for ``key`` held.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                cached_columns = []
+                if entry is not None and not self._expired(entry[2]):
+                    frame, cached, _, _ = entry
+                    if self._covers(cached, columns):
+                        self._entries.move_to_end(key)
+                        return self._project(frame, columns)
+                    cached_columns = [c for c in frame.columns if c in cached]
+                pending = self._loading.get(key)
+                if pending is None:
+                    pending = self._loading[key] = Future()
+                    generation = self._generation
+                    break
+            # the load in flight may not cover our columns; check again after it
+            pending.result()
+
+        if columns is None or (load_columns is None and entry is None):
+            to_load = columns
+        else:
+            to_load = list(dict.fromkeys(cached_columns + (load_columns or []) + columns))
+        try:
+            frame = loader(to_load)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(key, None)
+            # a load that raced an invalidation is returned but not kept
+            if generation == self._generation:
+                self._store(key, frame, None if to_load is None else frozenset(to_load))
+        pending.set_result(None)
+        return self._project(frame, columns)
+
+    def invalidate(self, key: Hashable = None):
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+                self._nbytes = 0
+            else:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._nbytes -= entry[3]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry[2])
+
+    def __len__(self) -> int:
+        return len(self._entries)
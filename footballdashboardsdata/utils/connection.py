@@ -0,0 +1,232 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+
+DEFAULT_CONNECTION_KEY = "M0neyMa$e"
+
+
+def default_connection_factory():
+    from dbconnect.connector import Connection
+
+    return Connection(DEFAULT_CONNECTION_KEY)
+
+
+class SQLiteConnection:
+    """
+    In-memory (or file backed) stand-in for ``dbconnect.connector.Connection``.
+
+    Schema qualifiers such as ``football_data.`` or ``derived.`` are stripped from
+    queries, so fixture tables can be loaded under their bare names.
+    """
+
+    SCHEMAS = ["football_data", "derived", "agg"]
+
+    def __init__(self, database: str = ":memory:", schemas: List[str] = None):
+        self._conn = sqlite3.connect(database, check_same_thread=False)
+        self._lock = threading.Lock()
+        schemas = self.SCHEMAS if schemas is None else schemas
+        self._schema_re = (
+            re.compile(r"\b(" + "|".join(re.escape(s) for s in schemas) + r")\.")
+            if schemas
+            else None
+        )
+
+    def _strip_schemas(self, query: str) -> str:
+        if self._schema_re is None:
+            return query
+        return self._schema_re.sub("", query)
+
+    def load_frame(self, table: str, data: pd.DataFrame, if_exists: str = "replace"):
+        with self._lock:
+            data.to_sql(table, self._conn, if_exists=if_exists, index=False)
+
+    def query(self, query: str, *args, **kwargs) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(self._strip_schemas(query), self._conn)
+
+    def close(self):
+        self._conn.close()
+
+
+class ConnectionProvider:
+    """
+    Bounded pool of database connections shared by the data sources.
+
+    Connections are created lazily by ``factory`` up to ``max_size`` and reused
+    across calls. ``acquire`` blocks for up to ``timeout`` seconds when every
+    connection is checked out. A connection whose caller raised is discarded
+    rather than returned to the pool, freeing its slot for a fresh one.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], object] = None,
+        max_size: int = 4,
+        timeout: Optional[float] = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._factory = factory or default_connection_factory
+        self._max_size = max_size
+        self._timeout = timeout
+        self._reset_pool()
+        _live_providers.add(self)
+
+    def _reset_pool(self):
+        self._idle = []
+        self._created = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def size(self) -> int:
+        return self._created
+
+    def _checkout(self):
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._available:
+            while not self._idle and self._created >= self._max_size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(
+                        f"No database connection available after {self._timeout} seconds"
+                    )
+                self._available.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._factory()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _checkin(self, conn):
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def _discard(self, conn):
+        close = getattr(conn, "close", None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            self._release_slot()
+
+    @contextmanager
+    def acquire(self) -> Iterator[object]:
+        conn = self._checkout()
+        try:
+            yield conn
+        except BaseException:
+            # the connection may be broken; do not hand it out again
+            self._discard(conn)
+            raise
+        self._checkin(conn)
+
+    def query(self, query: str, *args, **kwargs) -> pd.DataFrame:
+        with self.acquire() as conn:
+            return conn.query(query, *args, **kwargs)
+
+    def __getstate__(self):
+        # pool workers get a fresh, empty pool built from the same factory
+        return {"factory": self._factory, "max_size": self._max_size, "timeout": self._timeout}
+
+    def __setstate__(self, state):
+        self._factory = state["factory"]
+        self._max_size = state["max_size"]
+        self._timeout = state["timeout"]
+        self._reset_pool()
+        _live_providers.add(self)
+
+    def _reset_after_fork(self):
+        # a forked child must not share the parent's sockets; forget them unclosed
+        self._reset_pool()
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn in idle:
+            close = getattr(conn, "close", None)
+            if close is not None:
+                close()
+
+
+_live_providers: "weakref.WeakSet[ConnectionProvider]" = weakref.WeakSet()
+
+
+def _reset_providers_after_fork():
+    global _provider_lock
+    _provider_lock = threading.Lock()
+    for provider in list(_live_providers):
+        provider._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_providers_after_fork)
+
+
+class SQLiteConnectionProvider(ConnectionProvider):
+    """
+    Provider backed by a single shared ``SQLiteConnection``, for running offline.
+    """
+
+    def __init__(self, database: str = ":memory:", schemas: List[str] = None):
+        self.database = database
+        self.schemas = schemas
+        self.connection = SQLiteConnection(database, schemas)
+        super().__init__(factory=lambda: self.connection, max_size=1, timeout=None)
+
+    def __reduce__(self):
+        # other processes reopen the database file; an in-memory one cannot follow
+        if self.database == ":memory:":
+            raise TypeError("An in-memory SQLite provider cannot be sent to another process")
+        return (type(self), (self.database, self.schemas))
+
+    def load_frame(self, table: str, data: pd.DataFrame, if_exists: str = "replace"):
+        self.connection.load_frame(table, data, if_exists=if_exists)
+
+    def _discard(self, conn):
+        # the one shared connection holds the fixture tables; a failed query
+        # leaves it usable, so keep it open
+        self._release_slot()
+
+
+_provider: Optional[ConnectionProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_connection_provider() -> ConnectionProvider:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = ConnectionProvider()
+        return _provider
+
+
+def set_connection_provider(provider: Optional[ConnectionProvider]):
+    """
+    Replace the process-wide provider. Passing ``None`` restores the default
+    ``dbconnect`` backed pool on next use.
+    """
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,137 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def joint_group_codes(
+    left: pd.DataFrame, right: pd.DataFrame, columns: List[str]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Integer codes for the key ``columns`` that agree between ``left`` and ``right``.
+    """
+    keys = pd.concat([left[columns], right[columns]], ignore_index=True)
+    codes = keys.groupby(columns, sort=False, dropna=False).ngroup().to_numpy()
+    return codes[: len(left)], codes[len(left) :]
+
+
+def sum_in_windows(
+    event_groups: np.ndarray,
+    event_times: np.ndarray,
+    window_groups: np.ndarray,
+    window_starts: np.ndarray,
+    window_ends: np.ndarray,
+    event_weights: np.ndarray = None,
+) -> np.ndarray:
+    """
+    For every window, total the weights (or count) of the events in the same group
+    with ``start < time <= end``.
+
+    Events are sorted once by (group, time) and every window is answered with two
+    binary searches, so the cost is O((events + windows) log events) rather than
+    O(events * windows).
+
+    Args:
+        event_groups (np.ndarray): integer group code per event
+        event_times (np.ndarray): event time (e.g. minute); NaN events are ignored
+        window_groups (np.ndarray): integer group code per window
+        window_starts (np.ndarray): exclusive window start, may be -inf; a NaN
+            start or end (e.g. NULL minutes) gives an empty window
+        window_ends (np.ndarray): inclusive window end, may be inf
+        event_weights (np.ndarray, optional): weight per event. Defaults to counting.
+
+    Returns:
+        np.ndarray: one total per window
+    """
+    event_groups = np.asarray(event_groups)
+    event_times = np.asarray(event_times, dtype=float)
+    if event_weights is None:
+        event_weights = np.ones(len(event_times), dtype=np.int64)
+    event_weights = np.asarray(event_weights)
+
+    valid = ~np.isnan(event_times)
+    event_groups = event_groups[valid]
+    event_times = event_times[valid]
+    event_weights = event_weights[valid]
+    if len(event_times) == 0:
+        return np.zeros(len(window_groups), dtype=event_weights.dtype)
+
+    t_min = event_times.min()
+    t_max = event_times.max()
+    span = t_max - t_min + 2.0
+
+    def composite(groups, times):
+        return groups * span + (np.clip(times, t_min - 1.0, t_max) - t_min)
+
+    order = np.lexsort((event_times, event_groups))
+    sorted_keys = composite(event_groups[order], event_times[order])
+    cumulative = np.concatenate(
+        [np.zeros(1, dtype=event_weights.dtype), np.cumsum(event_weights[order])]
+    )
+
+    window_groups = np.asarray(window_groups)
+    window_starts = np.asarray(window_starts, dtype=float)
+    window_ends = np.asarray(window_ends, dtype=float)
+    # NaN keys would sort after every group and pick up all later events
+    empty = np.isnan(window_starts) | np.isnan(window_ends)
+    upper = np.searchsorted(
+        sorted_keys,
+        composite(window_groups, np.where(empty, t_min, window_ends)),
+        side="right",
+    )
+    lower = np.searchsorted(
+        sorted_keys,
+        composite(window_groups, np.where(empty, t_min, window_starts)),
+        side="right",
+    )
+    totals = cumulative[upper] - cumulative[np.minimum(lower, upper)]
+    totals[empty] = 0
+    return totals
+
+
+def on_pitch_totals(
+    players: pd.DataFrame,
+    events: pd.DataFrame,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    against: bool = True,
+    weight_col: str = None,
+    match_col: str = "match_id",
+    team_col: str = "squad",
+    time_col: str = "minute",
+) -> np.ndarray:
+    """
+    Total the events (goals, shots, xG, ...) that happened while each player was on
+    the pitch, i.e. in their match with ``start < time <= end``.
+
+    Args:
+        players (pd.DataFrame): one row per player-match, with ``match_col`` and
+            ``team_col``
+        events (pd.DataFrame): one row per event, with ``match_col``, ``team_col``
+            and ``time_col``
+        starts (np.ndarray): exclusive start time per player row, may be -inf
+        ends (np.ndarray): inclusive end time per player row
+        against (bool, optional): count the opposition's events (True) or the
+            player's own team's (False). Defaults to True.
+        weight_col (str, optional): event column to sum instead of counting rows
+
+    Returns:
+        np.ndarray: one total per player row
+    """
+    weights = None if weight_col is None else events[weight_col].to_numpy()
+    times = events[time_col].to_numpy(dtype=float)
+    team_event_codes, team_player_codes = joint_group_codes(
+        events, players, [match_col, team_col]
+    )
+    own = sum_in_windows(
+        team_event_codes, times, team_player_codes, starts, ends, weights
+    )
+    if not against:
+        return own
+    match_event_codes, match_player_codes = joint_group_codes(
+        events, players, [match_col]
+    )
+    total = sum_in_windows(
+        match_event_codes, times, match_player_codes, starts, ends, weights
+    )
+    return total - own
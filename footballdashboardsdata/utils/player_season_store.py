@@ -0,0 +1,311 @@
+import json
+import os
+import re
+import threading
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from footballdashboardsdata.utils.connection import ConnectionProvider
+from footballdashboardsdata.utils.possession_adjust import PossessionFactorStore
+
+KEY_COLS = [
+    "player_id",
+    "player",
+    "comp",
+    "squad",
+    "season",
+    "enriched_position",
+    "dob",
+    "gender",
+]
+
+# fbref columns that are per-match counts or totals, so a season value is the sum of
+# the match values. Averages and ratios (e.g. sweeper_action_avg_distance) must not
+# be listed: summing them is wrong, and requests needing them read match rows.
+ADDITIVE_FBREF_COLS = [
+    "minutes",
+    "game_started",
+    "goals",
+    "assists",
+    "pens_made",
+    "pens_att",
+    "pens_won",
+    "pens_conceded",
+    "shots_total",
+    "shots_on_target",
+    "shots_saved",
+    "shots_blocked",
+    "shots_offtarget",
+    "shots_woodwork",
+    "shots_leftfoot",
+    "shots_rightfoot",
+    "shots_head",
+    "shots_bodypart_other",
+    "goals_leftfoot",
+    "goals_rightfoot",
+    "goals_head",
+    "goals_bodypart_other",
+    "assisted_shots",
+    "xg",
+    "npxg",
+    "xa",
+    "xag",
+    "npxg_xa",
+    "sca",
+    "sca_passes_live",
+    "sca_passes_dead",
+    "sca_dribbles",
+    "sca_shots",
+    "sca_fouled",
+    "sca_defense",
+    "gca",
+    "gca_passes_live",
+    "gca_passes_dead",
+    "gca_dribbles",
+    "gca_shots",
+    "gca_fouled",
+    "gca_defense",
+    "passes",
+    "passes_completed",
+    "passes_short",
+    "passes_completed_short",
+    "passes_medium",
+    "passes_completed_medium",
+    "passes_long",
+    "passes_completed_long",
+    "passes_total_distance",
+    "passes_progressive_distance",
+    "progressive_passes",
+    "progressive_passes_received",
+    "passes_into_final_third",
+    "passes_into_penalty_area",
+    "crosses_into_penalty_area",
+    "passes_live",
+    "passes_dead",
+    "passes_free_kicks",
+    "passes_switches",
+    "passes_thrown",
+    "through_balls",
+    "passes_offsides",
+    "passes_blocked",
+    "passes_launched",
+    "passes_launched_completed",
+    "passes_launched_total",
+    "crosses",
+    "carries_into_final_3rd",
+    "carries_into_penalty_area",
+    "carry_progressive_distance",
+    "dribbles",
+    "dribbles_completed",
+    "dispossessed",
+    "miscontrols",
+    "touches",
+    "touches_def_pen_area",
+    "touches_def_3rd",
+    "touches_mid_3rd",
+    "touches_att_3rd",
+    "touches_att_pen_area",
+    "touches_live_ball",
+    "tackles",
+    "tackles_won",
+    "tackles_def_3rd",
+    "tackles_mid_3rd",
+    "tackles_att_3rd",
+    "tackles_vs_dribbles",
+    "tackles_vs_dribbles_won",
+    "dribbled_past",
+    "blocks",
+    "blocked_shots",
+    "blocked_passes",
+    "interceptions",
+    "clearances",
+    "aerials_won",
+    "aerials_lost",
+    "fouls",
+    "fouled",
+    "offsides",
+    "cards_yellow",
+    "cards_red",
+    "cards_yellow_red",
+    "psxg_gk",
+    "goals_conceded",
+    "shots_on_target_against",
+    "saves",
+    "crosses_gk",
+    "crosses_stopped_gk",
+    "sweeper_actions",
+]
+# columns merged in from derived.fbref_shot_aggregations
+SHOT_AGGREGATION_COLS = ["self_created_shots", "open_play_sca_for_others"]
+VALUE_COLS = ADDITIVE_FBREF_COLS + SHOT_AGGREGATION_COLS + ["row_count"]
+STORE_COLS = KEY_COLS + ["date"] + VALUE_COLS
+
+
+class PlayerSeasonStore:
+    """
+    Local Parquet copy of ``fbref`` (joined to ``fbref_shot_aggregations``) summed
+    per player, team, league, season, position, dob and gender, one file per
+    league-season.
+
+    Partitions have the ``STORE_COLS`` layout, summed like SQL ``SUM`` so a stat
+    that is NULL on every match stays NULL. ``columns`` only lists the value columns
+    every refresh actually fetched, so a listed name fbref does not have is never
+    served as NULLs. ``row_count`` counts match rows and ``date`` holds the last
+    match date. ``refresh`` only reads matches the store has not
+    seen and folds them into the existing sums. Team-match touches for possession
+    adjustment are kept alongside.
+
+    Parquet IO goes through pandas and needs ``pyarrow`` (the ``store`` extra).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        possession_path = self._possession_path()
+        self.possession = (
+            PossessionFactorStore.load(possession_path)
+            if os.path.exists(possession_path)
+            else PossessionFactorStore()
+        )
+
+    def _partition_path(self, comp: str, season: int, kind: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_-]+", "_", f"{comp}_{season}")
+        return os.path.join(self.root, f"{name}.{kind}")
+
+    def _possession_path(self) -> str:
+        return os.path.join(self.root, "possession.pkl")
+
+    def covers(self, leagues: Iterable[str], season: int) -> bool:
+        return all(
+            os.path.exists(self._partition_path(league, season, "aggregates.parquet"))
+            for league in leagues
+        )
+
+    def columns(self, league: str, season: int) -> List[str]:
+        """
+        Columns of a stored partition, from the schema written next to it.
+        """
+        with open(self._partition_path(league, season, "columns.json")) as f:
+            return json.load(f)
+
+    def read(
+        self, leagues: Iterable[str], season: int, columns: List[str] = None
+    ) -> pd.DataFrame:
+        with self._lock:
+            return pd.concat(
+                [
+                    pd.read_parquet(
+                        self._partition_path(league, season, "aggregates.parquet"),
+                        columns=columns,
+                    )
+                    for league in leagues
+                ],
+                ignore_index=True,
+            )
+
+    def known_match_ids(self, league: str, season: int) -> pd.Series:
+        path = self._partition_path(league, season, "matches.parquet")
+        if not os.path.exists(path):
+            return pd.Series([], dtype=object)
+        return pd.read_parquet(path)["match_id"]
+
+    def possession_factors(
+        self, leagues: Iterable[str], season: int
+    ) -> Optional[pd.DataFrame]:
+        return self.possession.factors(leagues, [season])
+
+    @staticmethod
+    def _query_new_rows(
+        conn: ConnectionProvider, league: str, season: int, known: pd.Series
+    ) -> pd.DataFrame:
+        query = f"""
+        SELECT * FROM football_data.fbref
+        WHERE comp = '{league}' AND season = {season}
+        """
+        if len(known) > 0:
+            known_str = ",".join([f"'{i}'" for i in known])
+            query += f" AND match_id NOT IN ({known_str})"
+        data = conn.query(query)
+        if len(data) == 0:
+            return data
+        match_ids = ",".join([f"'{i}'" for i in data["match_id"].unique()])
+        shots = conn.query(
+            f"""
+            SELECT * FROM derived.fbref_shot_aggregations
+            WHERE comp = '{league}' AND season = {season}
+            AND match_id IN ({match_ids})
+            """
+        )
+        data = pd.merge(
+            data, shots, on=["match_id", "squad", "player"], how="left", suffixes=("", "_y")
+        )
+        return data.drop([c for c in data.columns if c.endswith("_y")], axis=1)
+
+    @staticmethod
+    def aggregate(data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Sum match rows (or partial aggregates) to one row per ``KEY_COLS`` with the
+        ``STORE_COLS`` schema, whatever columns and dtypes ``data`` came with.
+        """
+        if "row_count" not in data.columns:
+            data = data.assign(row_count=1)
+        data = data.reindex(columns=STORE_COLS).astype(dict.fromkeys(VALUE_COLS, float))
+        groups = data.groupby(KEY_COLS, dropna=False, sort=False)
+        aggregated = pd.concat(
+            [groups["date"].max(), groups[VALUE_COLS].sum(min_count=1)], axis=1
+        )
+        return aggregated.reset_index()
+
+    def refresh(self, conn: ConnectionProvider, leagues: Iterable[str], season: int) -> int:
+        """
+        Fold matches of ``leagues`` in ``season`` that the store has not seen into
+        the stored aggregates. Returns the number of new matches.
+        """
+        new_matches = 0
+        with self._lock:
+            for league in leagues:
+                known = self.known_match_ids(league, season)
+                data = self._query_new_rows(conn, league, season, known)
+                if len(data) == 0:
+                    continue
+                data["date"] = pd.to_datetime(data["date"])
+                aggregates_path = self._partition_path(league, season, "aggregates.parquet")
+                aggregates = self.aggregate(data)
+                if os.path.exists(aggregates_path):
+                    aggregates = self.aggregate(
+                        pd.concat([pd.read_parquet(aggregates_path), aggregates], ignore_index=True)
+                    )
+                fetched = set(data.columns) | {"row_count"}
+                if os.path.exists(aggregates_path):
+                    fetched &= set(self.columns(league, season))
+                aggregates.to_parquet(aggregates_path, index=False)
+                with open(self._partition_path(league, season, "columns.json"), "w") as f:
+                    json.dump([c for c in STORE_COLS if c in fetched], f)
+
+                matches = data[["match_id", "date"]].drop_duplicates("match_id")
+                matches_path = self._partition_path(league, season, "matches.parquet")
+                if os.path.exists(matches_path):
+                    matches = pd.concat([pd.read_parquet(matches_path), matches], ignore_index=True)
+                matches.to_parquet(matches_path, index=False)
+
+                self.possession.update(data)
+                new_matches += data["match_id"].nunique()
+            self.possession.save(self._possession_path())
+        return new_matches
+
+
+_STORE: Optional[PlayerSeasonStore] = None
+
+
+def get_player_season_store() -> Optional[PlayerSeasonStore]:
+    """
+    The configured store, or None when data sources should read ``fbref``.
+    """
+    return _STORE
+
+
+def set_player_season_store(store: Optional[PlayerSeasonStore]):
+    global _STORE
+    _STORE = store
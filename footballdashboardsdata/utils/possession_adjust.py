@@ -1,126 +1,201 @@
-import pandas as pd
+import threading
+from typing import Iterable, Optional
 
+import pandas as pd
 
-def aggregate_to_match_id(data: pd.DataFrame) -> pd.DataFrame:
-    return (
-        data.groupby(["match_id", "comp", "season"])
-        .agg({"touches": "sum"})
-        .reset_index()
-    )
+FACTOR_KEYS = ["comp", "squad", "season"]
+TEAM_MATCH_KEYS = ["comp", "season", "match_id", "squad", "opponent"]
 
 
-def aggregate_to_league_season_team(data: pd.DataFrame) -> pd.DataFrame:
-    return (
-        data.groupby(["comp", "squad", "season"])
-        .agg({"touches": "sum", "match_id": "nunique"})
-        .reset_index()
+def team_match_touches(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse player-match rows to one row of touches per team per match. This is
+    the only pass over the raw rows; every factor is derived from its output.
+    """
+    return data.groupby(TEAM_MATCH_KEYS, dropna=False, as_index=False).agg(
+        {"touches": "sum"}
     )
 
 
-def aggregate_to_league_season_opponent(data: pd.DataFrame) -> pd.DataFrame:
-    return (
-        data.groupby(["comp", "opponent", "season"])
-        .agg({"touches": "sum", "match_id": "nunique"})
-        .reset_index()
-    )
+def factors_from_team_matches(team_matches: pd.DataFrame) -> pd.DataFrame:
+    """
+    Possession factors per (comp, squad, season) from team-match touch totals.
 
-
-def compute_league_average(data: pd.DataFrame) -> pd.DataFrame:
-    return (
-        data.pipe(aggregate_to_match_id)
-        .groupby(["comp", "season"])
-        .agg({"touches": "mean"})
-        .reset_index()
+    ``raw_*`` factors compare a team's (or its opponents') share of match touches
+    to an even split; the ``in_possession_factor`` and ``out_of_possession_factor``
+    columns additionally scale by how busy the team's matches are relative to the
+    league average.
+    """
+    team = team_matches.groupby(["comp", "season", "squad"]).agg(
+        touches=("touches", "sum"), matches=("match_id", "nunique")
     )
-
-
-def compute_team_average(data: pd.DataFrame) -> pd.DataFrame:
-    data = data.pipe(aggregate_to_league_season_team)
-    data["touches_per_match"] = data["touches"] / data["match_id"]
-    return data[["squad", "comp", "season", "touches_per_match"]]
-
-
-def compute_opponent_average(data: pd.DataFrame) -> pd.DataFrame:
-    data = data.pipe(aggregate_to_league_season_opponent)
-    data["touches_per_match"] = data["touches"] / data["match_id"]
-    return data[["opponent", "comp", "season", "touches_per_match"]]
-
-
-def total_touches_per_match(data: pd.DataFrame) -> pd.DataFrame:
-    team_averages = data.pipe(compute_team_average)
-    opponent_averages = data.pipe(compute_opponent_average)
-    combined = pd.merge(
-        left=team_averages,
-        right=opponent_averages,
-        left_on=["squad", "comp", "season"],
-        right_on=["opponent", "comp", "season"],
-        suffixes=("_team", "_opponent"),
+    opponent = team_matches.groupby(["comp", "season", "opponent"]).agg(
+        touches=("touches", "sum"), matches=("match_id", "nunique")
     )
-
-    combined["per_game_touches"] = (
-        combined["touches_per_match_team"] + combined["touches_per_match_opponent"]
+    opponent.index = opponent.index.set_names("squad", level="opponent")
+    league = team_matches.groupby(["comp", "season"]).agg(
+        touches=("touches", "sum"), matches=("match_id", "nunique")
     )
-    return combined[["comp", "squad", "season", "per_game_touches"]]
-
 
-def total_possession_factor(data: pd.DataFrame) -> pd.DataFrame:
-    ttpm = data.pipe(total_touches_per_match)
-    league_averages = data.pipe(compute_league_average)
-    combined = pd.merge(left=ttpm, right=league_averages, on=["comp", "season"])
-    combined["total_possession_factor"] = (
-        combined["touches"] / combined["per_game_touches"]
+    factors = pd.DataFrame(
+        {
+            "touches_per_match": team["touches"] / team["matches"],
+            "opponent_touches_per_match": (opponent["touches"] / opponent["matches"]),
+        }
+    ).loc[team.index]
+    factors["per_game_touches"] = (
+        factors["touches_per_match"] + factors["opponent_touches_per_match"]
     )
+    factors = factors.reset_index()
+    league_touches = (league["touches"] / league["matches"]).rename("league_touches")
+    factors = factors.merge(league_touches.reset_index(), on=["comp", "season"])
 
-    return combined[["comp", "squad", "season", "total_possession_factor"]]
-
-
-def in_possession_factor(data: pd.DataFrame) -> pd.DataFrame:
-    team_averages = data.pipe(compute_team_average)
-    ttpm = data.pipe(total_touches_per_match)
-    combined = pd.merge(
-        left=team_averages,
-        right=ttpm,
-        left_on=["comp", "squad", "season"],
-        right_on=["comp", "squad", "season"],
+    factors["total_possession_factor"] = (
+        factors["league_touches"] / factors["per_game_touches"]
     )
-    combined["in_possession_factor"] = 0.5 / (
-        combined["touches_per_match"] / combined["per_game_touches"]
+    factors["raw_in_possession_factor"] = 0.5 / (
+        factors["touches_per_match"] / factors["per_game_touches"]
     )
-    return combined[["comp", "squad", "season", "in_possession_factor"]]
-
-
-def out_possession_factor(data: pd.DataFrame) -> pd.DataFrame:
-    opp_averages = data.pipe(compute_opponent_average)
-    ttpm = data.pipe(total_touches_per_match)
-    combined = pd.merge(
-        left=opp_averages,
-        right=ttpm,
-        left_on=["comp", "opponent", "season"],
-        right_on=["comp", "squad", "season"],
+    factors["raw_out_of_possession_factor"] = 0.5 / (
+        factors["opponent_touches_per_match"] / factors["per_game_touches"]
+    )
+    factors["in_possession_factor"] = (
+        factors["raw_in_possession_factor"] * factors["total_possession_factor"]
     )
-    combined["out_possession_factor"] = 0.5 / (
-        combined["touches_per_match"] / combined["per_game_touches"]
+    factors["out_of_possession_factor"] = (
+        factors["raw_out_of_possession_factor"] * factors["total_possession_factor"]
     )
-    return combined[["comp", "squad", "season", "out_possession_factor"]]
+    return factors[
+        FACTOR_KEYS
+        + [
+            "total_possession_factor",
+            "raw_in_possession_factor",
+            "raw_out_of_possession_factor",
+            "in_possession_factor",
+            "out_of_possession_factor",
+        ]
+    ]
+
+
+def possession_factors(data: pd.DataFrame) -> pd.DataFrame:
+    return factors_from_team_matches(team_match_touches(data))
 
 
 def adj_possession_factors(data: pd.DataFrame) -> pd.DataFrame:
-    combined = pd.merge(
-        left=data.pipe(total_possession_factor),
-        right=data.pipe(in_possession_factor),
-        on=["comp", "squad", "season"],
-    )
-    combined = pd.merge(
-        left=combined,
-        right=data.pipe(out_possession_factor),
-        on=["comp", "squad", "season"],
-    )
-    combined["in_possession_factor"] = (
-        combined["in_possession_factor"] * combined["total_possession_factor"]
-    )
-    combined["out_of_possession_factor"] = (
-        combined["out_possession_factor"] * combined["total_possession_factor"]
-    )
-    return combined[
+    return possession_factors(data)[
         ["comp", "squad", "season", "in_possession_factor", "out_of_possession_factor"]
     ]
+
+
+class PossessionFactorStore:
+    """
+    Team-match touch totals kept per (comp, season) so factors can be served
+    without regrouping the raw rows.
+
+    ``update`` only aggregates matches it has not seen before; factors for a
+    (comp, season) are recomputed lazily after it changes. A match is never
+    re-read once held, so call ``invalidate`` when source rows are corrected. The
+    store can be saved to and loaded from disk.
+    """
+
+    def __init__(self, team_matches: pd.DataFrame = None):
+        self._team_matches = {}
+        self._factors = {}
+        self._lock = threading.RLock()
+        if team_matches is not None:
+            self._add_team_matches(team_matches)
+
+    def _add_team_matches(self, team_matches: pd.DataFrame):
+        for (comp, season), group in team_matches.groupby(["comp", "season"]):
+            key = (comp, season)
+            existing = self._team_matches.get(key)
+            if existing is not None:
+                group = group.loc[~group["match_id"].isin(existing["match_id"])]
+                if len(group) == 0:
+                    continue
+                group = pd.concat([existing, group], ignore_index=True)
+            self._team_matches[key] = group.reset_index(drop=True)
+            self._factors.pop(key, None)
+
+    def known_match_ids(self, comp: str, season: int) -> pd.Series:
+        with self._lock:
+            existing = self._team_matches.get((comp, season))
+            return (
+                pd.Series([], dtype=object) if existing is None else existing["match_id"]
+            )
+
+    def update(self, data: pd.DataFrame):
+        """
+        Add the matches in ``data`` (player-match rows) that the store does not
+        hold yet.
+        """
+        with self._lock:
+            known = [
+                df["match_id"]
+                for (comp, season), df in self._team_matches.items()
+                if ((data["comp"] == comp) & (data["season"] == season)).any()
+            ]
+            if known:
+                data = data.loc[~data["match_id"].isin(pd.concat(known))]
+            if len(data) > 0:
+                self._add_team_matches(team_match_touches(data))
+
+    def invalidate(self, comp: str = None, season: int = None):
+        """
+        Drop the stored matches of ``comp`` and/or ``season`` (everything by
+        default), so the next ``update`` re-reads them.
+        """
+        with self._lock:
+            for key in list(self._team_matches):
+                if (comp is None or key[0] == comp) and (season is None or key[1] == season):
+                    self._team_matches.pop(key)
+                    self._factors.pop(key, None)
+
+    def factors(
+        self, comps: Iterable[str], seasons: Iterable[int]
+    ) -> Optional[pd.DataFrame]:
+        """
+        Factors for every stored (comp, season) combination of ``comps`` and
+        ``seasons``, or None if any of them is missing.
+        """
+        frames = []
+        with self._lock:
+            for comp in comps:
+                for season in seasons:
+                    key = (comp, season)
+                    if key not in self._team_matches:
+                        return None
+                    if key not in self._factors:
+                        self._factors[key] = factors_from_team_matches(
+                            self._team_matches[key]
+                        )
+                    frames.append(self._factors[key])
+        return pd.concat(frames, ignore_index=True)
+
+    def to_frame(self) -> pd.DataFrame:
+        with self._lock:
+            if not self._team_matches:
+                return pd.DataFrame(columns=TEAM_MATCH_KEYS + ["touches"])
+            return pd.concat(self._team_matches.values(), ignore_index=True)
+
+    def save(self, path: str):
+        self.to_frame().to_pickle(path)
+
+    @classmethod
+    def load(cls, path: str) -> "PossessionFactorStore":
+        return cls(pd.read_pickle(path))
+
+
+_STORE: Optional[PossessionFactorStore] = None
+
+
+def get_possession_factor_store() -> Optional[PossessionFactorStore]:
+    """
+    The configured store, or None when factors are computed from the rows at hand.
+    """
+    return _STORE
+
+
+def set_possession_factor_store(store: Optional[PossessionFactorStore]):
+    global _STORE
+    _STORE = store
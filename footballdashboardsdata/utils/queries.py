@@ -1,46 +1,157 @@
-from dbconnect.connector import Connection
-from typing import List, Dict
+import pandas as pd
+from typing import List, Dict, Union
+from footballdashboardsdata.utils.caching import TTLCache
+from footballdashboardsdata.utils.connection import (
+    ConnectionProvider,
+    get_connection_provider,
+)
 
+NAME_LOOKUP_TTL = 3600.0
 
-def get_league_gender(fb_league_name: str) -> str:
-    conn = Connection("M0neyMa$e")
-    return conn.query(
-        f"""SELECT gender FROM mclachbot_leagues WHERE league_name='{fb_league_name}'"""
-    )["gender"][0]
 
+class DecoratedNameLookup:
+    """
+    In-memory copy of ``mclachbot_teams`` and ``mclachbot_leagues``.
 
-def get_decorated_team_name_from_fb_name(fb_team_name: str, league_name: str) -> str:
-    conn = Connection("M0neyMa$e")
-    gender = get_league_gender(league_name)
-    data = conn.query(
-        f"""SELECT decorated_name FROM mclachbot_teams 
-
-    WHERE team_name='{fb_team_name}' 
-    AND gender = '{gender}'
+    Teams are keyed by (fbref name, gender) and (WhoScored name, gender), leagues
+    by fbref and WhoScored name.
     """
+
+    def __init__(self, teams: pd.DataFrame, leagues: pd.DataFrame):
+        self.teams_by_fb_name = self._index(teams, ["team_name", "gender"])
+        self.teams_by_ws_name = self._index(teams, ["ws_team_name", "gender"])
+        self.leagues_by_fb_name = self._index(leagues, ["league_name"])
+        self.leagues_by_ws_name = self._index(leagues, ["ws_league_name"])
+        self.league_genders = (
+            leagues.drop_duplicates("league_name").set_index("league_name")["gender"]
+        )
+
+    @staticmethod
+    def _index(data: pd.DataFrame, keys: List[str]) -> pd.Series:
+        return (
+            data.dropna(subset=keys)
+            .drop_duplicates(keys)
+            .set_index(keys)["decorated_name"]
+        )
+
+    @classmethod
+    def load(cls, conn: ConnectionProvider) -> "DecoratedNameLookup":
+        teams = conn.query(
+            "SELECT team_name, ws_team_name, gender, decorated_name FROM mclachbot_teams"
+        )
+        leagues = conn.query(
+            "SELECT league_name, ws_league_name, gender, decorated_name FROM mclachbot_leagues"
+        )
+        return cls(teams, leagues)
+
+    def league_gender(self, league_name: str) -> str:
+        return self.league_genders[league_name]
+
+    def team_name(
+        self, team_name: str, gender: str, default: str = None, source: str = "fbref"
+    ) -> str:
+        index = self.teams_by_ws_name if source == "whoscored" else self.teams_by_fb_name
+        return index.get((team_name, gender), default)
+
+    def league_name(
+        self, league_name: str, default: str = None, source: str = "fbref"
+    ) -> str:
+        index = (
+            self.leagues_by_ws_name if source == "whoscored" else self.leagues_by_fb_name
+        )
+        return index.get(league_name, default)
+
+    def team_names(
+        self,
+        team_names: pd.Series,
+        genders: Union[str, pd.Series],
+        source: str = "fbref",
+    ) -> pd.Series:
+        """
+        Vectorized team decoration. Unknown teams map to NaN.
+        """
+        index = self.teams_by_ws_name if source == "whoscored" else self.teams_by_fb_name
+        team_names = pd.Series(team_names)
+        if isinstance(genders, str):
+            genders = pd.Series(genders, index=team_names.index)
+        keys = pd.MultiIndex.from_arrays([team_names.to_numpy(), pd.Series(genders).to_numpy()])
+        return pd.Series(
+            index.reindex(keys).to_numpy(), index=team_names.index, name="decorated_name"
+        )
+
+    def league_names(self, league_names: pd.Series, source: str = "fbref") -> pd.Series:
+        """
+        Vectorized league decoration. Unknown leagues map to NaN.
+        """
+        index = (
+            self.leagues_by_ws_name if source == "whoscored" else self.leagues_by_fb_name
+        )
+        return pd.Series(league_names).map(index).rename("decorated_name")
+
+
+_NAME_LOOKUP_CACHE = TTLCache(ttl=NAME_LOOKUP_TTL, max_entries=8)
+
+
+def get_name_lookup(conn: ConnectionProvider = None) -> DecoratedNameLookup:
+    conn = conn or get_connection_provider()
+    return _NAME_LOOKUP_CACHE.get_or_load(
+        conn, lambda: DecoratedNameLookup.load(conn)
     )
-    if len(data) == 0:
+
+
+def invalidate_name_lookup():
+    _NAME_LOOKUP_CACHE.invalidate()
+
+
+def get_league_gender(fb_league_name: str, conn: ConnectionProvider = None) -> str:
+    return get_name_lookup(conn).league_gender(fb_league_name)
+
+
+def get_decorated_team_name_from_fb_name(
+    fb_team_name: str, league_name: str, conn: ConnectionProvider = None
+) -> str:
+    lookup = get_name_lookup(conn)
+    gender = lookup.league_gender(league_name)
+    decorated_name = lookup.team_name(fb_team_name, gender)
+    if decorated_name is None:
         return fb_team_name.replace("_", " ").title()
     else:
-        return data["decorated_name"][0]
+        return decorated_name
 
 
-def get_decorated_league_name_from_fb_name(fb_league_name: str) -> str:
-    conn = Connection("M0neyMa$e")
-    return conn.query(
-        f"""SELECT decorated_name FROM mclachbot_leagues WHERE league_name='{fb_league_name}'"""
-    )["decorated_name"][0]
+def get_decorated_league_name_from_fb_name(
+    fb_league_name: str, conn: ConnectionProvider = None
+) -> str:
+    return get_name_lookup(conn).leagues_by_fb_name[fb_league_name]
 
 
 def get_multiple_decorated_league_names_from_fb_names(
-    fb_league_names: List[str],
+    fb_league_names: List[str], conn: ConnectionProvider = None
 ) -> Dict[str, str]:
-    conn = Connection("M0neyMa$e")
-    league_str = ", ".join([f"'{x}'" for x in fb_league_names])
-    return (
-        conn.query(
-            f"""SELECT league_name, decorated_name FROM mclachbot_leagues WHERE league_name IN ({league_str})"""
-        )
-        .set_index("league_name")
-        .to_dict()["decorated_name"]
-    )
+    lookup = get_name_lookup(conn)
+    return {
+        league: lookup.leagues_by_fb_name[league]
+        for league in fb_league_names
+        if league in lookup.leagues_by_fb_name.index
+    }
+
+
+def decorate_team_names_from_fb_names(
+    fb_team_names: pd.Series,
+    genders: Union[str, pd.Series],
+    conn: ConnectionProvider = None,
+) -> pd.Series:
+    """
+    Bulk version of ``get_decorated_team_name_from_fb_name`` keyed by gender, with
+    the same title-case fallback for unknown teams.
+    """
+    fb_team_names = pd.Series(fb_team_names)
+    decorated = get_name_lookup(conn).team_names(fb_team_names, genders)
+    return decorated.fillna(fb_team_names.str.replace("_", " ").str.title())
+
+
+def decorate_league_names_from_fb_names(
+    fb_league_names: pd.Series, conn: ConnectionProvider = None
+) -> pd.Series:
+    fb_league_names = pd.Series(fb_league_names)
+    return get_name_lookup(conn).league_names(fb_league_names).fillna(fb_league_names)
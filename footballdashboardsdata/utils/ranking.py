@@ -0,0 +1,89 @@
+from typing import Dict, Hashable, List
+
+import numpy as np
+import pandas as pd
+
+
+class PercentileIndex:
+    """
+    Sorted copy of a baseline distribution answering "share of the baseline strictly
+    below this value" with a binary search per query.
+
+    Zeros are left out of the baseline by default, so players who never recorded a
+    stat do not inflate everybody else's percentile.
+    """
+
+    def __init__(self, values: np.ndarray, exclude_zero: bool = True):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if exclude_zero:
+            values = values[values != 0]
+        self.sorted_values = np.sort(values)
+
+    def __len__(self) -> int:
+        return len(self.sorted_values)
+
+    def percentile(self, values: np.ndarray) -> np.ndarray:
+        """
+        Fraction of the baseline below each of ``values``. NaN queries rank at 0;
+        an empty baseline ranks everything as NaN.
+        """
+        values = np.asarray(values, dtype=float)
+        if len(self.sorted_values) == 0:
+            return np.full(values.shape, np.nan)
+        below = np.searchsorted(self.sorted_values, values, side="left")
+        below = np.where(np.isnan(values), 0, below)
+        return below / len(self.sorted_values)
+
+
+class RankingIndex:
+    """
+    One ``PercentileIndex`` per (group, stat), e.g. goalkeepers ranked on
+    goalkeeping categories and outfield players on the rest.
+
+    Args:
+        baseline (pd.DataFrame): population to rank against
+        baseline_groups (pd.Series): group key of every baseline row
+        group_stats (Dict[Hashable, List[str]]): stats ranked within each group
+        exclude_zero (bool, optional): leave zeros out of the baselines. Defaults to True.
+    """
+
+    def __init__(
+        self,
+        baseline: pd.DataFrame,
+        baseline_groups: pd.Series,
+        group_stats: Dict[Hashable, List[str]],
+        exclude_zero: bool = True,
+    ):
+        self.group_stats = group_stats
+        baseline_groups = np.asarray(baseline_groups)
+        self.indexes = {
+            (group, stat): PercentileIndex(
+                baseline.loc[baseline_groups == group, stat].to_numpy(), exclude_zero
+            )
+            for group, stats in group_stats.items()
+            for stat in stats
+        }
+
+    def rank(
+        self, data: pd.DataFrame, groups: pd.Series, suffix: str = "_ranking"
+    ) -> pd.DataFrame:
+        """
+        Percentile of every row of ``data`` within its group, one ``<stat><suffix>``
+        column per stat. Stats that do not apply to a row's group are NaN. Columns
+        appear in the order their group first occurs in ``groups``.
+        """
+        groups = np.asarray(groups)
+        ranks = pd.DataFrame(index=data.index)
+        for group in pd.unique(groups):
+            if group not in self.group_stats:
+                continue
+            mask = groups == group
+            for stat in self.group_stats[group]:
+                column = f"{stat}{suffix}"
+                if column not in ranks:
+                    ranks[column] = np.nan
+                ranks.loc[mask, column] = self.indexes[(group, stat)].percentile(
+                    data.loc[mask, stat].to_numpy()
+                )
+        return ranks
@@ -1,3 +1,6 @@
+from typing import Dict, List
+
+
 def get_all_subclasses(cls):
     all_subclasses = []
 
@@ -6,3 +9,47 @@ def get_all_subclasses(cls):
         all_subclasses.extend(get_all_subclasses(subclass))
 
     return all_subclasses
+
+
+class SubclassRegistry:
+    """
+    Name -> class mapping filled in at class-definition time, so lookups do not
+    walk the subclass tree on every call.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._classes: Dict[str, type] = {}
+
+    def register(self, name: str, cls: type):
+        existing = self._classes.get(name)
+        if existing is not None and not _same_definition(existing, cls):
+            raise ValueError(
+                f"Duplicate {self.kind} name '{name}': "
+                f"{existing.__module__}.{existing.__qualname__} and "
+                f"{cls.__module__}.{cls.__qualname__}"
+            )
+        self._classes[name] = cls
+
+    def get(self, name: str) -> type:
+        try:
+            return self._classes[name]
+        except KeyError as e:
+            raise ValueError(f"Invalid {self.kind} name: {name}") from e
+
+    def names(self) -> List[str]:
+        return sorted(self._classes)
+
+    def items(self) -> Dict[str, type]:
+        return dict(self._classes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._classes
+
+    def __len__(self) -> int:
+        return len(self._classes)
+
+
+def _same_definition(a: type, b: type) -> bool:
+    # a module that is reloaded (or run as __main__ and imported) redefines its classes
+    return a.__module__ == b.__module__ and a.__qualname__ == b.__qualname__
@@ -21,9 +21,14 @@ setup(
     install_requires=[
         "setuptools>=45.0",
         "pandas",
+        "scipy",
         "footballmodels",
         "dbconnect @ git+http://github.com/dmoggles/dbconnect",
     ],
+    extras_require={
+        # Parquet IO for the materialized player-season store
+        "store": ["pyarrow"],
+    },
     classifiers=[
         "Development Status :: 1 - Planning",
         "Programming Language :: Python :: 3.0",
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from footballdashboardsdata.besteleven import ScoreTable
+
+
+def reference_frame(dtype=object) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "position": ["CB", "CB", "FW", "FW"],
+            "data_attribute": pd.Series(
+                ["tackles", "winning_goals", "goals", "winning_goals"], dtype=dtype
+            ),
+            "score": [1.0, 2.0, 3.0, 4.0],
+            "data_category": ["defending", "result", "attacking", "result"],
+        }
+    )
+
+
+@pytest.mark.parametrize("dtype", [object, "string"])
+def test_score_table_layout(dtype):
+    table = ScoreTable(reference_frame(dtype))
+    assert isinstance(table.attributes, np.ndarray)
+    assert list(table.attributes) == ["tackles", "winning_goals", "goals"]
+    assert list(table.positions) == ["CB", "FW"]
+    np.testing.assert_array_equal(
+        table.scores, [[1.0, 2.0, np.nan], [np.nan, 4.0, 3.0]]
+    )
+    np.testing.assert_array_equal(
+        table.present, [[True, True, False], [False, True, True]]
+    )
+    for array in [table.attributes, table.scores, table.categories, table.present]:
+        assert not array.flags.writeable
+
+
+def test_score_table_multi_leg_zeroes_result_attributes():
+    table = ScoreTable(reference_frame(), multi_leg=True)
+    np.testing.assert_array_equal(table.scores[:, 1], [0.0, 0.0])
+    assert table.scores[0, 0] == 1.0
@@ -0,0 +1,42 @@
+import numpy as np
+
+from footballdashboardsdata.utils.intervals import sum_in_windows
+
+
+def brute_force(event_groups, event_times, window_groups, starts, ends):
+    return np.array(
+        [
+            sum(
+                1
+                for g, t in zip(event_groups, event_times)
+                if g == wg and s < t <= e
+            )
+            for wg, s, e in zip(window_groups, starts, ends)
+        ]
+    )
+
+
+def test_sum_in_windows_matches_brute_force():
+    rng = np.random.default_rng(0)
+    event_groups = rng.integers(0, 5, 200)
+    event_times = rng.integers(1, 95, 200).astype(float)
+    window_groups = rng.integers(0, 6, 100)
+    starts = rng.choice([-np.inf, 10.0, 45.0, 60.0], 100)
+    ends = rng.choice([30.0, 70.0, 90.0, np.inf], 100)
+    np.testing.assert_array_equal(
+        sum_in_windows(event_groups, event_times, window_groups, starts, ends),
+        brute_force(event_groups, event_times, window_groups, starts, ends),
+    )
+
+
+def test_nan_window_bounds_give_empty_windows():
+    event_groups = np.array([0, 0, 1, 1, 2, 2])
+    event_times = np.array([10.0, 20.0, 10.0, 20.0, 10.0, 20.0])
+    totals = sum_in_windows(
+        event_groups,
+        event_times,
+        window_groups=np.array([0, 0, 1, 1]),
+        window_starts=np.array([0.0, np.nan, -np.inf, 0.0]),
+        window_ends=np.array([np.nan, 90.0, 90.0, 15.0]),
+    )
+    np.testing.assert_array_equal(totals, [0, 0, 2, 1])
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from footballdashboardsdata.scatter import ScatterDataSource
+from footballdashboardsdata.utils.connection import SQLiteConnectionProvider
+from footballdashboardsdata.utils.player_season_store import PlayerSeasonStore
+
+pytest.importorskip("pyarrow")
+
+
+def fbref_rows(match_ids) -> pd.DataFrame:
+    rows = []
+    for match_id in match_ids:
+        for squad, opponent in [("home", "away"), ("away", "home")]:
+            for i in range(3):
+                rows.append(
+                    {
+                        "match_id": str(match_id),
+                        "week": match_id,
+                        "date": f"2023-08-{match_id + 1:02d}",
+                        "player_id": f"{squad}_{i}",
+                        "player": f"{squad} {i}",
+                        "comp": "League",
+                        "squad": squad,
+                        "opponent": opponent,
+                        "season": 2023,
+                        "enriched_position": "GK" if i == 0 else "CB",
+                        "dob": "1995-01-01",
+                        "gender": "m",
+                        "minutes": 90.0,
+                        "touches": 10.0 * (i + 1),
+                        "goals": float(i),
+                        # keepers only
+                        "psxg_gk": 1.0 if i == 0 else np.nan,
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def provider():
+    provider = SQLiteConnectionProvider()
+    provider.load_frame("fbref", fbref_rows(range(2)))
+    shots = fbref_rows(range(4))[["match_id", "squad", "player", "comp", "season"]]
+    provider.load_frame("fbref_shot_aggregations", shots.assign(self_created_shots=1.0))
+    return provider
+
+
+def test_columns_lists_only_fetched_columns(provider, tmp_path):
+    store = PlayerSeasonStore(str(tmp_path))
+    assert store.refresh(provider, ["League"], 2023) == 2
+    columns = store.columns("League", 2023)
+    assert {"minutes", "goals", "psxg_gk", "self_created_shots", "row_count"} <= set(columns)
+    # listed as additive, but not in this fbref
+    assert "saves" not in columns
+    assert "open_play_sca_for_others" not in columns
+
+
+def test_refresh_folds_new_matches(provider, tmp_path):
+    store = PlayerSeasonStore(str(tmp_path))
+    store.refresh(provider, ["League"], 2023)
+    provider.load_frame("fbref", fbref_rows(range(4)))
+    assert store.refresh(provider, ["League"], 2023) == 2
+    assert store.refresh(provider, ["League"], 2023) == 0
+    data = store.read(["League"], 2023).set_index("player_id")
+    assert data.loc["home_2", "goals"] == 8.0
+    assert data.loc["home_2", "row_count"] == 4.0
+    assert data.loc["home_0", "self_created_shots"] == 4.0
+    assert np.isnan(data.loc["home_1", "psxg_gk"])
+    assert data.loc["home_1", "date"] == pd.Timestamp("2023-08-04")
+
+
+def test_scatter_reads_store_only_for_fetched_columns(provider, tmp_path, monkeypatch):
+    store = PlayerSeasonStore(str(tmp_path))
+    store.refresh(provider, ["League"], 2023)
+    monkeypatch.setattr(
+        "footballdashboardsdata.scatter.get_player_season_store", lambda: store
+    )
+    source = ScatterDataSource(provider)
+    columns = source.AGGREGATE_KEY_COLS + ["row_count", "minutes"]
+    data = source._read_player_season_store(columns + ["psxg_gk"], ["League"], 2023)
+    assert len(data) == 6
+    assert data["psxg_gk"].isna().sum() == 4
+    assert source._read_player_season_store(columns + ["saves"], ["League"], 2023) is None
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from footballdashboardsdata.utils import possession_adjust
+from footballdashboardsdata.utils.possession_adjust import PossessionFactorStore
+
+
+def player_rows(home_touches: float) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "comp": "League",
+            "season": 2023,
+            "match_id": ["1", "1", "1", "1"],
+            "squad": ["home", "home", "away", "away"],
+            "opponent": ["away", "away", "home", "home"],
+            "touches": [home_touches, home_touches, 100.0, 100.0],
+        }
+    )
+
+
+def test_no_store_is_configured_by_default():
+    assert possession_adjust.get_possession_factor_store() is None
+
+
+def test_store_matches_direct_factors():
+    data = player_rows(300.0)
+    store = PossessionFactorStore()
+    store.update(data)
+    pd.testing.assert_frame_equal(
+        store.factors(["League"], [2023]), possession_adjust.possession_factors(data)
+    )
+
+
+def test_store_rereads_matches_only_after_invalidate():
+    store = PossessionFactorStore()
+    store.update(player_rows(300.0))
+    before = store.factors(["League"], [2023])
+    store.update(player_rows(100.0))
+    pd.testing.assert_frame_equal(store.factors(["League"], [2023]), before)
+
+    store.invalidate("League", 2023)
+    assert store.factors(["League"], [2023]) is None
+    store.update(player_rows(100.0))
+    factors = store.factors(["League"], [2023]).set_index("squad")
+    assert factors.loc["home", "raw_in_possession_factor"] == pytest.approx(1.0)
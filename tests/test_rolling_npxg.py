@@ -0,0 +1,105 @@
+from itertools import permutations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from footballdashboardsdata.rolling_npxg import RollingNPXGBySeasonDataSource
+from footballdashboardsdata.utils.connection import SQLiteConnectionProvider
+
+TEAMS = ["arsenal", "chelsea", "everton", "fulham"]
+
+
+def fbref_rows() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    rows = []
+    for week, (home, away) in enumerate(permutations(TEAMS, 2)):
+        for squad, opponent in [(home, away), (away, home)]:
+            for player in range(3):
+                rows.append(
+                    {
+                        "match_id": f"{home}-{away}",
+                        "date": f"2023-{week // 4 + 8:02d}-{week % 4 * 7 + 1:02d}",
+                        "comp": "EPL",
+                        "season": 2022,
+                        "squad": squad,
+                        "opponent": opponent,
+                        "player": f"{squad} {player}",
+                        "npxg": rng.random() * 0.3,
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def source():
+    provider = SQLiteConnectionProvider()
+    provider.load_frame("fbref", fbref_rows())
+    provider.load_frame(
+        "mclachbot_teams",
+        pd.DataFrame(
+            {
+                "team_name": TEAMS,
+                "ws_team_name": TEAMS,
+                "gender": "m",
+                "decorated_name": [t.title() for t in TEAMS],
+            }
+        ),
+    )
+    provider.load_frame(
+        "mclachbot_leagues",
+        pd.DataFrame(
+            {
+                "league_name": ["EPL"],
+                "ws_league_name": ["EPL"],
+                "gender": ["m"],
+                "decorated_name": ["Premier League"],
+            }
+        ),
+    )
+    return RollingNPXGBySeasonDataSource(provider)
+
+
+def test_team_stays_the_first_positional_argument(source):
+    positional = source.impl_get_data("arsenal", "EPL", 2022, 3, False)
+    keyword = source.impl_get_data(
+        team="arsenal", league="EPL", season=2022, rolling_window=3, normalized=False
+    )
+    pd.testing.assert_frame_equal(positional, keyword)
+    assert (positional["team_img"] == "arsenal").all()
+    assert len(positional) == 6 - 3 + 1
+
+
+def test_all_teams_matches_single_team(source):
+    everyone = source.impl_get_data(None, "EPL", 2022, 3, True, all_teams=True)
+    arsenal = source.impl_get_data("arsenal", "EPL", 2022, 3, True)
+    columns = ["date", "opponent", "npxg", "npxg_opp", "round"]
+    pd.testing.assert_frame_equal(
+        everyone.loc[everyone["team_img"] == "arsenal", columns].reset_index(drop=True),
+        arsenal[columns],
+    )
+
+
+def test_team_arguments_are_checked(source):
+    with pytest.raises(ValueError):
+        source.impl_get_data(league="EPL", season=2022, rolling_window=3, normalized=False)
+    with pytest.raises(ValueError):
+        source.impl_get_data("arsenal", "EPL", 2022, 3, False, all_teams=True)
+    with pytest.raises(TypeError):
+        source.impl_get_data("arsenal", "EPL", 2022)
+
+
+def test_team_match_without_npxg_counts_as_zero(source):
+    fbref = fbref_rows()
+    missing = (fbref["match_id"] == "arsenal-chelsea") & (fbref["squad"] == "arsenal")
+    fbref.loc[missing, "npxg"] = np.nan
+    source.conn.load_frame("fbref", fbref)
+
+    match_date = fbref.loc[missing, "date"].iloc[0]
+    per_match = source.impl_get_data("arsenal", "EPL", 2022, 1, False)
+    assert len(per_match) == 6
+    assert per_match.loc[per_match["date"] == match_date, "npxg"].tolist() == [0.0]
+    # windows over that match are kept rather than dropped as NaN
+    assert len(source.impl_get_data("arsenal", "EPL", 2022, 3, False)) == 4
+    everyone = source.impl_get_data(None, "EPL", 2022, 3, False, all_teams=True)
+    assert (everyone["team_img"] == "arsenal").sum() == 4